@@ -38,11 +38,21 @@
 ################## Required packages for running our code #####################
 #------------------------------------------------------------------------------
 
+import sys
 import math
-import numpy as np
-import pychrono as chrono
 import matplotlib.pyplot as plt
-import pychrono.irrlicht as chronoirr
+from bridge_models import build_bridge, simulate, solve_static
+from bridge_vis import open_window, RenderScheduler
+from convergence import SteadyStateMonitor, transient_end
+from reaction_recorder import ReactionRecorder
+from pose_recorder import PoseRecorder
+from result_store import ResultStore
+from solver_config import SolverConfig
+from profiling import PhaseTimer
+
+# Running the script as "python <script> --headless" skips Irrlicht entirely 
+# and only runs the physics, i.e. for batch runs on machines with no display
+headless = "--headless" in sys.argv
 
 #------------------------------------------------------------------------------
 ########################### Classes and functions #############################
@@ -135,9 +145,6 @@ def Rect_inertia(b,h):                                          # Function to de
 ##################### Bridge dimensions and parameters ########################
 #------------------------------------------------------------------------------
 
-# Gravity Vector
-g = chrono.ChVectorD(0,-9.81,0)         # gravitational acceleration in [m/s^2]
-
 # Geometric Parameters
 l = 152.4                               # length of bridge in [m] (500 ft)
 w = 22.86                               # width of bridge in [m] (75 ft)
@@ -145,173 +152,80 @@ d = .3048                               # depth of bridge in [m] (12 in)
 
 # Material Properties
 rho_c = 2500                            # density of concrete in [kg/m^3] (156.07 lb/ft^3)
-mat = chrono.ChMaterialSurfaceNSC()     # ground material contact system
-
-# Weight and Mass Calculations
-vol = l/2*w*d                           # total volume of reinforced concrete in [m^3]
-mass = vol*rho_c                        # total mass of reinforced concrete in [kg]
-weight_num = mass*g.Length()            # total weight of reinforced concrete in [N]
 
 # Simulation Parameters
 time_step = 2e-3                        # time step of simulation [s]
-time_end = 15                           # start time of simulation [s]
+time_end = 15                           # end time of simulation [s]
 omg = math.pi/(2*time_end)              # rotational velocity of motors [rad/s]
+render_fps = 30                         # frame rate of the Irrlicht window [frames/s]
+render_every = None                     # renders every Nth step instead of at 'render_fps' if set
+steady_rtol = None                      # stops early once the reactions settle within this tolerance
+solver = SolverConfig()                 # solver and timestepper, i.e. SolverConfig("apgd", max_iters=100)
+profile = None                          # "phases" writes a timing breakdown of the run, "cprofile" also runs cProfile
+store_dir = None                        # directory the reactions are streamed to while running, if set
+pose_every = None                       # records the deck poses every Nth step if set, see |PoseRecorder|
 
-#------------------------------------------------------------------------------
-########################### Bascule Bridge Model ##############################
-#------------------------------------------------------------------------------
+params = {"l": l, "w": w, "d": d, "rho_c": rho_c,
+          "time_step": time_step, "time_end": time_end, "omg": omg}
 
-# Create Chrono system with NSC contact
-system = chrono.ChSystemNSC()           
-system.Set_G_acc(g)                     
-z2x = chrono.Q_from_AngY(0)             
-
-# Create ground body, textures it as water, and adds it to system
-ground_thickness = 0.2
-ground_pos_y = 0
-ground = chrono.ChBodyEasyBox(1.2*l, 1, 5*(w+10), 1000, True, True, mat)
-system.AddBody(ground)
-ground.SetIdentifier(0)
-ground.SetBodyFixed(True)
-ground.SetName("table")
-ground.SetPos(chrono.ChVectorD(0, ground_pos_y, 0))
-ground.GetVisualShape(0).SetTexture(chrono.GetChronoDataFile("textures/water1.jpg"))
-
-# Creates first pylon using ChBodyEasyBox centered at -76.2 m/-250 feet, textures it as concrete, and adds <py1> to the system
-py1 = chrono.ChBodyEasyBox(1,10,w,1000,True,True, mat)
-py1.SetPos(chrono.ChVectorD(-l/2,5.5,5))
-py1.GetVisualShape(0).SetTexture(chrono.GetChronoDataFile("textures/concrete.jpg"))
-py1.SetIdentifier(1)
-py1.SetBodyFixed(True)
-py1.SetCollide(True)
-system.Add(py1)
-
-# Creates second pylon using ChBodyEasyBox centered at 76.2 m/250 feet, textures it as concrete, and adds <py2> to the system
-py2 = chrono.ChBodyEasyBox(1,10,w,1000,True,True, mat)
-py2.GetVisualShape(0).SetTexture(chrono.GetChronoDataFile("textures/concrete.jpg"))
-py2.SetIdentifier(2)
-py2.SetPos(chrono.ChVectorD(l/2,5.5,5))
-py2.SetBodyFixed(True)
-py2.SetCollide(True)
-system.Add(py2)
-
-# Creates first bridge deck using ChBodyEasyBox centered at -38.1 m/-125 feet, textures it as concrete, and adds <deck1> to the system
-deck1 = chrono.ChBodyEasyBox(l/2,d,w,1000,True,True, mat)
-deck1.SetMass(mass)
-deck1.GetVisualShape(0).SetTexture(chrono.GetChronoDataFile("textures/concrete.jpg"))
-deck1.SetIdentifier(3)
-deck1.SetPos(chrono.ChVectorD(-l/4,10+((d)/2),5))
-deck1.SetBodyFixed(False)
-deck1.SetCollide(True)
-system.Add(deck1)
-
-# Creates second bridge deck using ChBodyEasyBox centered at 38.1 m/125 feet, textures it as concrete, and adds <deck1> to the system
-deck2 = chrono.ChBodyEasyBox(l/2,d,w,1000,True,True, mat)
-deck2.SetMass(mass)
-deck2.GetVisualShape(0).SetTexture(chrono.GetChronoDataFile("textures/concrete.jpg"))
-deck2.SetIdentifier(4)
-deck2.SetPos(chrono.ChVectorD(l/4,10+((d)/2),5))
-deck2.SetBodyFixed(False)
-deck2.SetCollide(True)
-system.Add(deck2)
-
-###############################################################################
-################# MOTORS AND JOINTS (COMMENT OUT THE SECTION ##################
-##################### THAT WILL NOT BE USED FOR ANALYSIS) #####################
-###############################################################################
+# Times each phase of the run when 'profile' is set, see |PhaseTimer|
+timer = PhaseTimer(enabled=bool(profile), cprofile=(profile == "cprofile"))
+timer.start_profile()
 
 #------------------------------------------------------------------------------
-# This section contains both the joints, used for pseudo-static analysis, as 
-# well as the motors for the full kinematic analysis. Simply comment out the 
-# joints AND uncomment the motors if you want to run the kinematic analysis, or
-# vice-versa for the pseudo-static analysis. For simplicity, each pair of 
-# joints and motors are called <jmX> where the X is an identifier. We did this
-# so the end user only has to comment/uncomment between the motors and the 
-# joints - none of the data collection code or arrays code needs to be changed
-# when switching from joints to motors or vice-versa.
+########################### Bascule Bridge Model ##############################
 #------------------------------------------------------------------------------
 
-
-
-
 #------------------------------------------------------------------------------
-############### Section for pseudo-static analysis using joints ###############
+# {build_bridge} creates the Chrono system, the ground, both pylons, both decks
+# and <jm1> between <py1> and <deck1> and <jm2> between <py2> and <deck2> (see
+# bridge_models.py). The mass of each deck is computed there from 'l', 'w', 'd'
+# and 'rho_c'.
+#
+# Set 'mj' to "pseudo-static" to connect the decks with revolute joints, or to
+# "kinematic" to drive them with motors ramped at -'omg' and 'omg'. None of the
+# data collection code needs to be changed when switching between the two.
+#
+# Set 'mj' to "static" to hold the decks horizontal and get the equilibrium
+# reactions from a single static solve with {solve_static} instead.
 #------------------------------------------------------------------------------
 
-
-#||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||
-
 mj = "pseudo-static"
 
-# Creates first revolute joint between <py1> and <deck1> at -76.2 m/-250 feet and adds <jm1> to the system
-jm1 = chrono.ChLinkLockRevolute()
-jm1.Initialize(py1, deck1, chrono.ChCoordsysD(chrono.ChVectorD(-l/2, 10, 5), z2x))
-system.AddLink(jm1)
-
-# Creates second revolute joint between <py2> and <deck2> at 76.2 m/250 feet and adds <jm2> to the system
-jm2 = chrono.ChLinkLockRevolute()
-jm2.Initialize(py2, deck2, chrono.ChCoordsysD(chrono.ChVectorD(l/2, 10, 5), z2x))
-system.AddLink(jm2)
-
-#||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||
-
-
-
-
-
-#------------------------------------------------------------------------------
-################# Section for kinematic analysis using motors #################
-#------------------------------------------------------------------------------
-
-
-#||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||
-
-# mj = "kinematic"
-
-# # Creates first motor driving <py1> and <deck1> at -76.2 m/-250 feet with a ramped rotational velocity of -'omg' and adds <jm1> to the system
-# jm1 = chrono.ChLinkMotorRotationAngle()
-# jm1.Initialize(py1, deck1, chrono.ChFrameD(chrono.ChVectorD(-l/2, 10, 5), z2x))
-# jm1.SetAngleFunction(chrono.ChFunction_Ramp(0, -omg))
-# system.AddLink(jm1)
-
-# # Creates second motor driving <py2> and <deck2> at 76.2 m/250 feet with a ramped rotational velocity of 'omg' and adds <jm2> to the system
-# jm2 = chrono.ChLinkMotorRotationAngle()
-# jm2.Initialize(py2, deck2, chrono.ChFrameD(chrono.ChVectorD(l/2, 10, 5), z2x))
-# jm2.SetAngleFunction(chrono.ChFunction_Ramp(0, omg))
-# system.AddLink(jm2)
-
-#||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||
-
-
-
-
+with timer.phase("build"):
+    model = build_bridge("bascule", mj, params, solver)
+system = model.system
 
 #------------------------------------------------------------------------------
 #################### Irrlicht visualization of simulation #####################
 #------------------------------------------------------------------------------
 
-vis = chronoirr.ChVisualSystemIrrlicht()
-vis.AttachSystem(system)
-vis.SetWindowSize(1024,768)
-vis.SetWindowTitle('bascule bridge')
-vis.Initialize()
-vis.AddSkyBox()
-vis.AddCamera(chrono.ChVectorD(-200, 0, 3))
-vis.AddTypicalLights()
+scheduler = None
+if not headless and mj != "static":
+    with timer.phase("window"):
+        vis = open_window(system, 'bascule bridge')
+    scheduler = RenderScheduler(vis, fps=render_fps, every=render_every)
 
 #------------------------------------------------------------------------------
 ########################## Arrays for data storage ############################
 #------------------------------------------------------------------------------
 
-array_time = []                         # Array for time
-array_1x = []                           # Array for X reaction force at joint1/motor1
-array_1y = []                           # Array for Y reaction force at joint1/motor1
-array_1z = []                           # Array for Z reaction force at joint1/motor1
-array_1t = []                           # Array for reaction torque at joint1/motor1
-array_2x = []                           # Array for X reaction force at joint2/motor2
-array_2y = []                           # Array for Y reaction force at joint2/motor2
-array_2z = []                           # Array for Z reaction force at joint2/motor2
-array_2t = []                           # Array for reaction torque at joint2/motor2
+# Preallocated record of the time, reaction forces and reaction torques at each
+# joint/motor. 'rec.force'[:,0] holds the X, Y and Z reaction force at
+# joint1/motor1, 'rec.torque'[:,0,2] the reaction torque at joint1/motor1, etc.
+# With 'store_dir' set the samples are streamed to a |ResultStore| there in
+# chunks instead of being kept in memory.
+store = ResultStore.for_model(store_dir, model) if store_dir else None
+rec = ReactionRecorder(model.links, time_end, time_step, sink=store)
+
+# Poses of the decks every 'pose_every' steps, for clearance checks and
+# animations, streamed to the same store as the reactions if there is one
+poses = PoseRecorder.for_model(model, pose_every, sink=store) if pose_every else None
+
+# Stops the run early once the reactions have settled, see |SteadyStateMonitor|
+monitor = None
+if steady_rtol:
+    monitor = SteadyStateMonitor(rtol=steady_rtol)
 
 #------------------------------------------------------------------------------
 ######################## Simulation of bridge model ###########################
@@ -319,26 +233,21 @@ array_2t = []                           # Array for reaction torque at joint2/mo
 
 #------------------------------------------------------------------------------
 # This section runs the simulation on our system for a length of 'time_end' and
-# a time step of 'time_step'. We collect the reaction forces and torques from
-# each motor/joint in arrays intialized above.
+# a time step of 'time_step' with {simulate}. We collect the reaction forces 
+# and torques from each motor/joint in <rec>, initialized above. The Irrlicht
+# window is only redrawn when <scheduler> says a frame is due, so several 
+# physics steps run between frames.
 #------------------------------------------------------------------------------
 
-while (vis.Run() and system.GetChTime() < time_end):
-    
-    array_time.append(system.GetChTime())
-    array_1x.append(jm1.Get_react_force().x)
-    array_1y.append(jm1.Get_react_force().y)
-    array_1z.append(jm1.Get_react_force().z)
-    array_1t.append(jm1.Get_react_torque().z)
-    array_2x.append(jm2.Get_react_force().x)
-    array_2y.append(jm2.Get_react_force().y)
-    array_2z.append(jm2.Get_react_force().z)
-    array_2t.append(jm2.Get_react_torque().z)
-    
-    vis.BeginScene() 
-    vis.Render()
-    vis.EndScene()
-    system.DoStepDynamics(time_step)
+if mj == "static":
+    with timer.phase("solve"):
+        rec = solve_static(model)                               # Equilibrium reactions from one static solve, no time stepping
+    if store is not None:                                       # The solve replaces the recorder, so its reactions are stored here
+        store.append(time=rec.time, force=rec.force, torque=rec.torque)
+else:
+    simulate(model, rec, scheduler, monitor, timer, poses)
+    if monitor is not None:
+        print(monitor.report(time_end))
 
 #------------------------------------------------------------------------------
 ######################## Calculations and plotting ############################
@@ -347,48 +256,72 @@ while (vis.Run() and system.GetChTime() < time_end):
 #------------------------------------------------------------------------------
 # This section computes the average reaction forces and torques at each
 # joint/motor, prints them to console, and plots the time history data as well.
-# Saves the plots to the local folder from which the script is ran.
+# Saves the plots to the local folder from which the script is ran. After a
+# static solve the averages are the equilibrium reactions and nothing is 
+# plotted.
+#
+# The averages and the plots leave out the startup transient: 'start' is the
+# first sample after it, found from the recorded reactions by {transient_end}.
 #------------------------------------------------------------------------------
-ave1 = np.sqrt(np.mean(array_1x)**2 + np.mean(array_1y)**2 + np.mean(array_1z)**2)
+start = transient_end(rec.time, rec.force, rec.torque)
+# After a static solve the motor torques are the torques holding the decks
+# horizontal, not averages of a run (see {build_bridge})
+torque_label = "Holding torque" if mj == "static" else "Average reaction torque"
+
+ave1 = rec.average_reaction(0, start)
 print("Average reaction at jm1: ",ave1)
 
-print("Average reaction torque at jm1:",np.mean(array_1t))
+print("%s at jm1:" % torque_label,rec.mean_torque(0, start))
 
-ave2 = np.sqrt(np.mean(array_2x)**2 + np.mean(array_2y)**2 + np.mean(array_2z)**2)
+ave2 = rec.average_reaction(1, start)
 print("Average reaction at jm2: ",ave2)
 
-print("Average reaction torque at jm2:",np.mean(array_2t))
-
-fig, (ax1, ax2, ax3) = plt.subplots(3, sharex = True)
-
-# ax1.plot(array_time,array_joint1_avg)
-ax1.plot(array_time,array_1x)
-ax1.plot(array_time,array_1y)
-ax1.plot(array_time,array_1z)
-ax1.set(ylabel='Reaction Force [N]')
-ax1.grid()
-
-# ax2.plot(array_time,array_joint2_avg)
-ax2.plot(array_time,array_2x)
-ax2.plot(array_time,array_2y)
-ax2.plot(array_time,array_2z)
-ax2.set(ylabel='Reaction Force [N]')
-ax2.grid()
-
-ax3.plot(array_time,array_1t)
-ax3.plot(array_time,array_2t)
-ax3.set(ylabel='Reaction Torque [Nm]',xlabel='Time [s]')
-ax3.grid()
-
-if mj == "pseudo-static":
-    plt.savefig('bascule bridge - pseudo-static.png')
-    plt.xlim(0.2, 4.95)
-    plt.show()
-elif mj == "kinematic":
-    plt.savefig('bascule bridge - kinematic.png')
-    plt.xlim(0.2, 4.95)
-    plt.show()
-else:
-    plt.savefig('bascule bridge - unknown.png')
-    plt.xlim(0.2, 4.95)
-    plt.show()
+print("%s at jm2:" % torque_label,rec.mean_torque(1, start))
+
+if mj != "static":                                              # A static solve has no time history to plot
+    timer.start("plot")
+    fig, (ax1, ax2, ax3) = plt.subplots(3, sharex = True)
+
+    ax1.plot(rec.time[start:],rec.force[start:,0])
+    ax1.set(ylabel='Reaction Force [N]')
+    ax1.grid()
+
+    ax2.plot(rec.time[start:],rec.force[start:,1])
+    ax2.set(ylabel='Reaction Force [N]')
+    ax2.grid()
+
+    ax3.plot(rec.time[start:],rec.torque[start:,:,2])
+    ax3.set(ylabel='Reaction Torque [Nm]',xlabel='Time [s]')
+    ax3.grid()
+
+    if mj == "pseudo-static":
+        plt.xlim(rec.time[start], rec.time[-1])
+        plt.savefig('bascule bridge - pseudo-static.png')
+        timer.stop("plot")
+        if not headless:
+            plt.show()
+    elif mj == "kinematic":
+        plt.xlim(rec.time[start], rec.time[-1])
+        plt.savefig('bascule bridge - kinematic.png')
+        timer.stop("plot")
+        if not headless:
+            plt.show()
+    else:
+        plt.xlim(rec.time[start], rec.time[-1])
+        plt.savefig('bascule bridge - unknown.png')
+        timer.stop("plot")
+        if not headless:
+            plt.show()
+
+# Closes the result store, which writes the metadata of the run next to the channels
+if store is not None:
+    if poses is not None:
+        poses.flush()
+    store.close()
+
+# Writes the timing breakdown of the run when 'profile' is set. Time spent
+# looking at the plot window is not part of the "plot" phase.
+timer.stop_profile()
+if profile:
+    print(timer.summary())
+    timer.write('bascule bridge - profile.json')
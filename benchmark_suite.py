@@ -0,0 +1,324 @@
+###############################################################################
+# Performance benchmark suite of the bridge models.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# Runs the static span, drawbridge, bascule and folding models in the
+# pseudo-static and kinematic modes (the static span has no kinematic mode)
+# headless for a fixed simulated 'duration' and measures, per case:
+#
+#   build_time   - time {build_bridge} takes [s]
+#   step_mean    - mean wall-clock time of one step, recording included [s]
+#   step_p50, step_p95, step_p99, step_max
+#                - percentiles and maximum of the step time [s]
+#   total_time   - wall-clock time of the whole run, build included [s]
+#   peak_rss_mb  - peak resident memory of the process running the case [MB]
+#
+# Every case runs in a fresh process, one after the other, so the peak memory
+# is that of the case alone and cases do not compete for cores. With
+# --repeat N the case is run N times and the smallest value of every metric
+# is kept, which is the least noisy estimate on a shared machine.
+#
+# The results are written as JSON, together with the Python, NumPy and Chrono
+# versions and the host they were measured on. The "compare" command checks a
+# new result file against a saved baseline and flags every metric that got
+# slower (or bigger) by more than --threshold, returning a non-zero exit code
+# so it can gate a CI job.
+#
+#   python benchmark_suite.py run --duration 5 --out baseline.json
+#   python benchmark_suite.py run --duration 5 --out current.json
+#   python benchmark_suite.py compare baseline.json current.json --threshold 0.1
+#
+# The "scaling" command times the folding bridge with 2 to 50 leaves instead,
+# to see how the cost of a step grows with the length of the chain, see
+# {run_scaling}. The "batch" command compares K bridges sharing one system
+# with K separate processes, see {run_batch_compare}.
+###############################################################################
+
+import sys
+import json
+import time
+import platform
+import resource
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import bridge_models
+from reaction_recorder import ReactionRecorder
+
+METRICS = ("build_time", "step_mean", "step_p50", "step_p95", "step_p99", "step_max",
+           "total_time", "peak_rss_mb")
+
+###############################################################################
+# {suite_cases} returns the (bridge, mode) pairs of the suite.
+###############################################################################
+
+def suite_cases(bridges=bridge_models.BRIDGE_TYPES, modes=("pseudo-static", "kinematic")):
+    return [(bridge, mode) for bridge in bridges for mode in modes
+            if not (mode == "kinematic" and bridge == "static")]
+
+###############################################################################
+# {run_case} builds and runs one case for 'duration' seconds of simulated
+# time and returns its metrics. It is called in a fresh worker process by
+# {run_isolated}, so it has to stay a module level function.
+###############################################################################
+
+def run_case(bridge, mode, params, duration, lean=False):
+    start = time.perf_counter()
+    model = bridge_models.build_bridge(bridge, mode, params, lean=lean)
+    build_time = time.perf_counter() - start
+
+    system = model.system
+    time_step = model.params["time_step"]
+    n_steps = int(round(duration/time_step))
+    rec = ReactionRecorder(model.links, duration, time_step)
+    step_times = np.empty(n_steps)
+
+    for k in range(n_steps):
+        t0 = time.perf_counter()
+        rec.record(system.GetChTime())
+        system.DoStepDynamics(time_step)
+        step_times[k] = time.perf_counter() - t0
+    total_time = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(step_times, (50, 95, 99))
+    return {"build_time": build_time, "step_mean": float(step_times.mean()),
+            "step_p50": float(p50), "step_p95": float(p95), "step_p99": float(p99),
+            "step_max": float(step_times.max()), "total_time": total_time,
+            "peak_rss_mb": _peak_rss_mb(), "steps": n_steps}
+
+def _peak_rss_mb():                                             # Peak resident memory of this process [MB]
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/2**20 if sys.platform == "darwin" else peak/2**10  # bytes on macOS, kB on Linux
+
+def run_isolated(bridge, mode, params, duration, lean=False):  # Runs {run_case} in a process of its own
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_case, bridge, mode, params, duration, lean).result()
+
+###############################################################################
+# {run_suite} runs every case 'repeat' times and returns the result document
+# that is written to JSON: the metadata of the run and the smallest value of
+# every metric per case, keyed "bridge/mode". With 'lean' the models are built
+# without visual shapes or collision, see {build_bridge}.
+###############################################################################
+
+def run_suite(cases=None, params=None, duration=5.0, repeat=1, lean=False):
+    cases = cases or suite_cases()
+    results = {}
+    for bridge, mode in cases:
+        case = "%s/%s" % (bridge, mode)
+        runs = [run_isolated(bridge, mode, params, duration, lean) for _ in range(repeat)]
+        r = results[case] = {name: min(run[name] for run in runs) for name in runs[0]}
+        print("%-28s build %8.4f s  step %9.2e s (p95 %9.2e s)  total %8.3f s  peak %7.1f MB"
+              % (case, r["build_time"], r["step_mean"], r["step_p95"], r["total_time"], r["peak_rss_mb"]))
+
+    return {"meta": _meta(params, duration, repeat, lean), "cases": results}
+
+def _meta(params, duration, repeat, lean):                     # What and where a result file was measured
+    return {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "duration": duration, "repeat": repeat,
+            "lean": lean, "params": bridge_models.make_params(params), "host": platform.node(),
+            "platform": platform.platform(), "python": platform.python_version(),
+            "numpy": np.__version__, "chrono": bridge_models.chrono_version()}
+
+###############################################################################
+# {run_scaling} runs the folding bridge with every number of leaves in
+# 'leaves' and returns a result document like {run_suite}, with the cases
+# keyed "folding-N/mode" so two scaling runs can be compared with {compare}
+# as well. It adds the exponent 'b' of a least squares fit of
+# step_mean = a*N^b and build_time = a*N^b per mode, i.e. 1 for a solver
+# whose cost grows linearly with the length of the chain.
+###############################################################################
+
+def run_scaling(leaves=range(2, 51), modes=("pseudo-static", "kinematic"), params=None,
+                duration=1.0, repeat=1, lean=False):
+    results = {}
+    exponents = {}
+    for mode in modes:
+        for n in leaves:
+            case = "folding-%d/%s" % (n, mode)
+            point = dict(params or {}, leaves=n)
+            runs = [run_isolated("folding", mode, point, duration, lean) for _ in range(repeat)]
+            r = results[case] = {name: min(run[name] for run in runs) for name in runs[0]}
+            r["leaves"] = n
+            print("%-28s build %8.4f s  step %9.2e s (p95 %9.2e s)  per leaf %9.2e s"
+                  % (case, r["build_time"], r["step_mean"], r["step_p95"], r["step_mean"]/n))
+
+        n = np.log(list(leaves))
+        rows = [results["folding-%d/%s" % (k, mode)] for k in leaves]
+        exponents[mode] = {metric: float(np.polyfit(n, np.log([r[metric] for r in rows]), 1)[0])
+                           for metric in ("step_mean", "build_time")}
+        print("%s: step time ~ N^%.2f, build time ~ N^%.2f"
+              % (mode, exponents[mode]["step_mean"], exponents[mode]["build_time"]))
+
+    return {"meta": _meta(params, duration, repeat, lean), "cases": results, "exponents": exponents}
+
+###############################################################################
+# {run_batch_case} builds 'k' instances of 'bridge' in one system with
+# {build_batch}, steps them for 'duration' seconds with one recorder each and
+# returns the build time, total time and instance-steps per second. Like
+# {run_case} it runs in a fresh worker process.
+###############################################################################
+
+def run_batch_case(bridge, mode, params, duration, k, lean=False):
+    start = time.perf_counter()
+    batch = bridge_models.build_batch(bridge, mode, [params]*k, lean=lean)
+    build_time = time.perf_counter() - start
+
+    system = batch.system
+    time_step = batch.models[0].params["time_step"]
+    n_steps = int(round(duration/time_step))
+    recorders = [ReactionRecorder(model.links, duration, time_step) for model in batch.models]
+    for _ in range(n_steps):
+        t = system.GetChTime()
+        for rec in recorders:
+            rec.record(t)
+        system.DoStepDynamics(time_step)
+    total_time = time.perf_counter() - start
+
+    return {"build_time": build_time, "total_time": total_time,
+            "throughput": k*n_steps/total_time, "peak_rss_mb": _peak_rss_mb()}
+
+###############################################################################
+# {run_batch_compare} measures, for every K in 'sizes', the throughput of K
+# instances of 'bridge' (instance-steps per second of wall-clock time):
+#
+#   shared    - all K in one system in one process, see {run_batch_case}
+#   processes - K separate single-bridge processes on up to 'workers' cores,
+#               process start-up included, as a sweep would run them
+#
+# The shared system runs on one core, so 'processes' wins on wall-clock time
+# once K exceeds the cores; 'shared_per_core' against 'processes_per_core'
+# shows which way uses each core better. Cases are keyed "bridge-xK/mode".
+###############################################################################
+
+def run_batch_compare(bridge="folding", mode="pseudo-static", sizes=(1, 2, 4, 8, 16, 32),
+                      params=None, duration=1.0, workers=None, lean=False):
+    workers = workers or multiprocessing.cpu_count()
+    context = multiprocessing.get_context("spawn")
+    n_steps = int(round(duration/bridge_models.make_params(params)["time_step"]))
+    results = {}
+    for k in sizes:
+        shared = run_isolated_batch(bridge, mode, params, duration, k, lean)
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=min(workers, k), mp_context=context) as pool:
+            list(pool.map(run_case, [bridge]*k, [mode]*k, [params]*k, [duration]*k, [lean]*k))
+        processes_time = time.perf_counter() - start
+        cores = min(workers, k)
+
+        r = results["%s-x%d/%s" % (bridge, k, mode)] = {
+            "instances": k, "shared_time": shared["total_time"], "shared_build_time": shared["build_time"],
+            "shared_throughput": shared["throughput"], "shared_per_core": shared["throughput"],
+            "shared_peak_rss_mb": shared["peak_rss_mb"], "processes_time": processes_time,
+            "processes_throughput": k*n_steps/processes_time,
+            "processes_per_core": k*n_steps/processes_time/cores, "processes_cores": cores}
+        print("K=%-4d shared %10.0f steps/s   processes %10.0f steps/s (%d cores, %10.0f per core)"
+              % (k, r["shared_throughput"], r["processes_throughput"], cores, r["processes_per_core"]))
+
+    return {"meta": _meta(params, duration, 1, lean), "cases": results}
+
+def run_isolated_batch(bridge, mode, params, duration, k, lean=False):  # Runs {run_batch_case} in a process of its own
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_batch_case, bridge, mode, params, duration, k, lean).result()
+
+###############################################################################
+# {compare} checks the cases of 'current' against 'baseline' and returns one
+# row per case and metric: (case, metric, baseline, current, relative change,
+# flagged). A metric is flagged when it grew by more than 'threshold'
+# (0.1 = 10 %). Cases missing from either file are skipped.
+###############################################################################
+
+def compare(baseline, current, threshold=0.1):
+    rows = []
+    for case, base in baseline["cases"].items():
+        if case not in current["cases"]:
+            continue
+        for metric in METRICS:
+            if metric not in base or metric not in current["cases"][case]:
+                continue
+            old, new = base[metric], current["cases"][case][metric]
+            change = (new - old)/old if old else 0.0
+            rows.append((case, metric, old, new, change, change > threshold))
+    return rows
+
+#------------------------------------------------------------------------------
+############################### Command line ##################################
+#------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bridge models and track regressions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite and write the results as JSON")
+    run.add_argument("--duration", type=float, default=5.0, help="simulated time of every case [s]")
+    run.add_argument("--time-step", type=float, default=None, help="time step of every case [s]")
+    run.add_argument("--bridges", default=",".join(bridge_models.BRIDGE_TYPES),
+                     help="comma separated bridge types (default: all)")
+    run.add_argument("--modes", default="pseudo-static,kinematic", help="comma separated analysis modes")
+    run.add_argument("--repeat", type=int, default=1, help="runs per case, the best of which is kept")
+    run.add_argument("--lean", action="store_true", help="build without visual shapes, textures or collision")
+    run.add_argument("--out", default="benchmark.json", help="JSON file for the results")
+
+    scale = commands.add_parser("scaling", help="time the folding bridge as the number of leaves grows")
+    scale.add_argument("--leaves", default="2,3,4,5,6,8,10,12,16,20,25,30,40,50",
+                       help="comma separated numbers of leaves")
+    scale.add_argument("--modes", default="pseudo-static,kinematic", help="comma separated analysis modes")
+    scale.add_argument("--duration", type=float, default=1.0, help="simulated time of every case [s]")
+    scale.add_argument("--time-step", type=float, default=None, help="time step of every case [s]")
+    scale.add_argument("--repeat", type=int, default=1, help="runs per case, the best of which is kept")
+    scale.add_argument("--lean", action="store_true", help="build without visual shapes, textures or collision")
+    scale.add_argument("--out", default="scaling.json", help="JSON file for the results")
+
+    batch = commands.add_parser("batch", help="K bridges in one system against K separate processes")
+    batch.add_argument("bridge", nargs="?", default="folding", choices=bridge_models.BRIDGE_TYPES)
+    batch.add_argument("--mode", choices=("pseudo-static", "kinematic"), default="pseudo-static")
+    batch.add_argument("--sizes", default="1,2,4,8,16,32", help="comma separated numbers of instances")
+    batch.add_argument("--duration", type=float, default=1.0, help="simulated time of every case [s]")
+    batch.add_argument("--time-step", type=float, default=None, help="time step of every case [s]")
+    batch.add_argument("--workers", type=int, default=None, help="cores for the separate processes")
+    batch.add_argument("--lean", action="store_true", help="build without visual shapes, textures or collision")
+    batch.add_argument("--out", default="batch.json", help="JSON file for the results")
+
+    cmp = commands.add_parser("compare", help="flag slowdowns of a result file against a baseline")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=0.1, help="relative increase that is flagged")
+    args = parser.parse_args(argv)
+
+    if args.command in ("run", "scaling", "batch"):
+        params = {"time_step": args.time_step} if args.time_step else None
+        if args.command == "batch":
+            sizes = [int(k) for k in args.sizes.split(",")]
+            results = run_batch_compare(args.bridge, args.mode, sizes, params, args.duration,
+                                        args.workers, args.lean)
+        elif args.command == "run":
+            cases = suite_cases(args.bridges.split(","), args.modes.split(","))
+            results = run_suite(cases, params, args.duration, args.repeat, args.lean)
+        else:
+            leaves = [int(n) for n in args.leaves.split(",")]
+            results = run_scaling(leaves, args.modes.split(","), params, args.duration, args.repeat, args.lean)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Results written to", args.out)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold)
+    flagged = [row for row in rows if row[5]]
+    for case, metric, old, new, change, slow in rows:
+        print("%-28s %-12s %12.4g %12.4g %+8.1f %% %s" % (case, metric, old, new, 100*change,
+                                                          "SLOWER" if slow else ""))
+    print("%d of %d metrics slower than the baseline by more than %.0f %%"
+          % (len(flagged), len(rows), 100*args.threshold))
+    return 1 if flagged else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+###############################################################################
+# Closed-form support reactions of the bridge layouts.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# Every layout in bridge_params.py is a statics textbook problem: uniform decks
+# of mass 'l'*'w'*'d'*'rho_c' (per deck length) on supports at known x
+# positions. The functions below solve them with NumPy for whole arrays of
+# parameters at once, so a design space can be screened before any Chrono
+# model is built. All parameters broadcast against each other, i.e. 'l' can be
+# an array of 1,000,000 spans and 'd' a scalar.
+#
+# Sign conventions (all in the xy plane of the models, z out of the plane):
+#
+#   force  - force the support (pylon or previous deck) applies to the deck(s)
+#            it carries, [Fx, Fy] in [N]
+#   torque - torque about z the support has to apply to hold the deck(s) at
+#            the given angles, counter-clockwise positive [Nm]. It is zero at
+#            the revolute pins of the static span.
+#
+# The angle of a deck is its rotation about z from horizontal, counter-
+# clockwise positive [rad]. In the kinematic mode the motors raise every leaf
+# that starts at a pylon, see {leaf_angles}.
+###############################################################################
+
+import numpy as np
+from bridge_params import BRIDGE_TYPES, DEFAULTS, G, layout
+
+###############################################################################
+# {_chain} returns the layout of 'bridge' for a unit span as arrays: deck
+# lengths and centers, joint positions, the index of the deck each joint
+# carries and the index of the deck it hangs from (-1 for a pylon). The
+# static span (one deck on two pins) is returned with 'pinned' set.
+# 'leaves' is the number of leaves of the folding bridge, here and below.
+###############################################################################
+
+def _chain(bridge, leaves=DEFAULTS["leaves"]):
+    decks, joints = layout(bridge, 1.0, leaves)
+    names = ["deck%d" % (i+1) for i in range(len(decks))]
+    lengths = np.array([length for length, _ in decks])
+    centers = np.array([x for _, x in decks])
+    xs = np.array([x for _, _, x, _ in joints])
+    child = [names.index(b2) for _, b2, _, _ in joints]
+    parent = [names.index(b1) if b1 in names else -1 for b1, _, _, _ in joints]
+    rates = [rate for _, _, _, rate in joints]
+    pinned = len(set(child)) < len(child)                      # A deck carried by two joints is a pinned span, not a chain
+    return lengths, centers, xs, child, parent, rates, pinned
+
+###############################################################################
+# {deck_masses} returns the mass of each deck [kg], shape (..., decks).
+###############################################################################
+
+def deck_masses(bridge, l=DEFAULTS["l"], w=DEFAULTS["w"], d=DEFAULTS["d"], rho_c=DEFAULTS["rho_c"],
+                leaves=DEFAULTS["leaves"]):
+    lengths = _chain(bridge, leaves)[0]
+    mass = np.asarray(l*w*d*rho_c, dtype=float)
+    return mass[..., None]*lengths
+
+###############################################################################
+# {leaf_angles} returns the angle of each deck at time 't' of a kinematic run
+# with motor speed 'omg', shape (..., decks). A motor ramp of 'rate'*'omg'
+# turns the deck it carries by -'rate'*'omg'*'t' relative to the body it
+# hangs from, so with the rates of bridge_params.py every leaf that starts at
+# a pylon rises and the folding decks fold in a zig-zag.
+###############################################################################
+
+def leaf_angles(bridge, t, omg, leaves=DEFAULTS["leaves"]):
+    _, _, _, child, parent, rates, pinned = _chain(bridge, leaves)
+    if pinned:
+        raise ValueError("The static span has no kinematic mode")
+    turn = np.asarray(omg*np.asarray(t), dtype=float)
+    angles = np.zeros(turn.shape + (len(child),))
+    for i, j, rate in zip(child, parent, rates):
+        angles[..., i] = -rate*turn + (angles[..., j] if j >= 0 else 0)
+    return angles
+
+###############################################################################
+# {reactions} returns the support reactions of 'bridge' holding its decks at
+# 'angles' (scalar or shape (..., decks), horizontal by default):
+#
+#   force  - shape (..., joints, 2) [N]
+#   torque - shape (..., joints) [Nm]
+#
+# For a chain, joint k carries every deck hanging from it; its force is their
+# total weight and its torque the sum of their weights times the horizontal
+# distance from the joint to their centers. The centers sit 'd'/2 above the
+# joints, as in the Chrono models, which matters once a deck is raised.
+###############################################################################
+
+def reactions(bridge, l=DEFAULTS["l"], w=DEFAULTS["w"], d=DEFAULTS["d"], rho_c=DEFAULTS["rho_c"],
+              angles=0.0, g=G, leaves=DEFAULTS["leaves"]):
+    lengths, centers, xs, child, parent, _, pinned = _chain(bridge, leaves)
+    l, d = np.asarray(l, dtype=float), np.asarray(d, dtype=float)
+    weights = deck_masses(bridge, l, w, d, rho_c, leaves)*g     # (..., decks)
+    angles = np.asarray(angles, dtype=float)
+    if angles.ndim == 0:
+        angles = np.full(len(lengths), float(angles))
+    shape = np.broadcast_shapes(weights.shape, angles.shape)
+    weights = np.broadcast_to(weights, shape)
+    angles = np.broadcast_to(angles, shape)
+    l = l[..., None]
+    n_joints = len(xs)
+
+    force = np.zeros(shape[:-1] + (n_joints, 2))
+    torque = np.zeros(shape[:-1] + (n_joints,))
+
+    if pinned:                                                  # One deck on two pins: half the weight on each, no moment
+        if np.any(angles != 0):
+            raise ValueError("The static span can only be solved horizontal")
+        force[..., 1] = weights/n_joints
+        return force, torque
+
+    # Position of the joint carrying every deck and of the center of the deck
+    cos, sin = np.cos(angles), np.sin(angles)
+    hinge_x = np.zeros(shape)                                   # x position of the joint carrying each deck
+    center_x = np.zeros(shape)
+    carried = {}
+    for k, (i, j) in enumerate(zip(child, parent)):
+        carried[i] = k
+        if j < 0:                                               # Joint on a pylon, at its position in the layout
+            hinge_x[..., i] = xs[k]*l[..., 0]
+        else:                                                   # Joint on deck j, rotated with it
+            ox = (xs[k] - xs[carried[j]])*l[..., 0]
+            hinge_x[..., i] = hinge_x[..., j] + cos[..., j]*ox
+        ox, oy = (centers[i] - xs[k])*l[..., 0], d/2
+        center_x[..., i] = hinge_x[..., i] + cos[..., i]*ox - sin[..., i]*oy
+
+    # Each joint carries its own deck and every deck further down the chain
+    for k in range(n_joints):
+        hx = hinge_x[..., child[k]]
+        for i in _downstream(child, parent, child[k]):
+            force[..., k, 1] += weights[..., i]
+            torque[..., k] += weights[..., i]*(center_x[..., i] - hx)
+
+    return force, torque
+
+def _downstream(child, parent, deck):                           # Decks carried by 'deck', including itself
+    decks = [deck]
+    for i, j in zip(child, parent):
+        if j in decks and i not in decks:
+            decks.append(i)
+    return decks
+
+###############################################################################
+# {screen} flags which configurations stay within 'max_force' [N] and
+# 'max_torque' [Nm] at every joint, over all of 'angles' if a sequence of
+# deck angles is given (i.e. the angles of a kinematic run from
+# {leaf_angles}). Returns a boolean array with the broadcast shape of the
+# parameters.
+###############################################################################
+
+def screen(bridge, l=DEFAULTS["l"], w=DEFAULTS["w"], d=DEFAULTS["d"], rho_c=DEFAULTS["rho_c"],
+           max_force=np.inf, max_torque=np.inf, angles=(0.0,), leaves=DEFAULTS["leaves"]):
+    ok = True
+    for a in angles:
+        force, torque = reactions(bridge, l, w, d, rho_c, a, leaves=leaves)
+        ok = ok & np.all(np.hypot(force[..., 0], force[..., 1]) <= max_force, axis=-1) \
+                & np.all(np.abs(torque) <= max_torque, axis=-1)
+    return ok
+
+###############################################################################
+# {validate} cross-checks {reactions} against Chrono: it builds 'bridge' in
+# the "static" mode with {build_bridge}, solves it with {solve_static} and
+# compares the reaction force magnitude and the torque about z at every
+# joint/motor. Returns a list of (name, chrono, analytic, relative error)
+# rows. The Chrono reaction torque is measured in the link frame, so only
+# its magnitude is compared.
+###############################################################################
+
+def validate(bridge, params=None):
+    import bridge_models
+
+    model = bridge_models.build_bridge(bridge, "static", params)
+    rec = bridge_models.solve_static(model)
+    p = model.params
+    force, torque = reactions(bridge, p["l"], p["w"], p["d"], p["rho_c"], leaves=p["leaves"])
+
+    rows = []
+    for k, name in enumerate(rec.names):
+        checks = [(name + " force", np.linalg.norm(rec.force[0, k]), np.hypot(*force[k])),
+                  (name + " torque", abs(rec.torque[0, k, 2]), abs(torque[k]))]
+        for label, chrono_value, value in checks:
+            scale = max(abs(chrono_value), abs(value), 1e-9)
+            rows.append((label, chrono_value, value, abs(chrono_value - value)/scale))
+    return rows
+
+if __name__ == "__main__":
+    for bridge in BRIDGE_TYPES:
+        print(bridge)
+        for label, chrono_value, value, error in validate(bridge):
+            print("  %-12s Chrono %14.6g  analytic %14.6g  rel. error %.2e" % (label, chrono_value, value, error))
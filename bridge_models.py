@@ -0,0 +1,353 @@
+###############################################################################
+# Library of the bridge models.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# The model scripts (static_standard_bridge.py, drawbridge.py,
+# bascule_motor.py and folding_with_motors.py) were all built from the same
+# template. This file holds that template once so a model can be built from a
+# bridge type, an analysis mode and a set of parameters instead of editing and
+# rerunning a script, i.e. for parameter sweeps. All models consist of two
+# pylons set 'l' apart symmetrically about the origin along the x-axis, with
+# the bridge deck(s) elevated to 10 m and the joints/motors rotating about z.
+# The bridge types, parameters and layouts themselves are in bridge_params.py.
+###############################################################################
+
+import time
+from importlib import metadata
+import pychrono as chrono
+from reaction_recorder import ReactionRecorder
+from reaction_stats import summarize, summarize_batch           # Kept importable from here, see reaction_stats.py
+from solver_config import SolverConfig
+from bridge_params import (BRIDGE_TYPES, MODES, TITLES, DEFAULTS, G, DECK_HEIGHT,
+                           make_params, layout)
+
+###############################################################################
+# |BridgeModel| holds everything {build_bridge} creates: the Chrono <system>,
+# the bodies by name ("ground", "py1", "py2", "deck1", ...), the decks in
+# order and the joints/motors <jm1>, <jm2>, ... in 'links'. 'hinges' holds,
+# for each link, the hinge point in the local frame of both bodies it joins,
+# which is what {constraint_drift} measures, and 'solver' the |SolverConfig|
+# the system was set up with.
+###############################################################################
+
+class BridgeModel:
+    def __init__(self, bridge, mode, params, system):
+        self.bridge = bridge
+        self.mode = mode
+        self.params = params
+        self.system = system
+        self.bodies = {}
+        self.decks = []
+        self.links = []
+        self.hinges = []
+        self.solver = None
+        self.lean = False
+
+    @property
+    def title(self):
+        return TITLES[self.bridge]
+
+###############################################################################
+# {build_bridge} builds one bridge model in its own ChSystemNSC. 'mode'
+# selects revolute joints ("pseudo-static") or motors with a ramped angle
+# ("kinematic"), which used to be done by commenting code in and out of the
+# scripts. 'params' is a dictionary of overrides of 'DEFAULTS'.
+#
+# In "static" mode the model is built for {solve_static}: the pins of the
+# static span stay revolute joints, but every hinge that has a motor in the
+# kinematic mode gets a motor held at a constant angle of 0. A deck on a free
+# revolute hinge is a pendulum with no equilibrium in the horizontal position,
+# so the hinge has to carry the holding torque for the static solve to mean
+# anything. That torque is not what the pseudo-static runs average: in the
+# full models the drawbridge, bascule and folding decks also rest on the
+# pylon tops (the deck bottoms at y = 10 overlap the pylons, whose tops are at
+# y = 10.5), so there the contact carries part of the load, and a lean
+# pseudo-static deck has nothing holding it and swings. A static solve
+# reports the whole weight moment at the motors instead, so {summarize}
+# names its torques "holding_torque" rather than "torque". Only the static
+# span, on its two pins, gives the same quantities in both modes.
+#
+# 'solver' is a |SolverConfig| applied to the system before anything is added
+# to it; by default the solver and timestepper of ChSystemNSC() are kept.
+#
+# With 'lean' the model is built for physics only: the bodies get no visual
+# shapes, no textures and no collision models, and the ground, which only
+# carries the water texture and the collision floor, is left out. Collision
+# detection then drops out of every step. Only the joints/motors hold the
+# bodies, so a free leaf of the pseudo-static mode swings through the pylon
+# and ground instead of hitting them, and the decks no longer press on the
+# tops of the pylons they overlap; the reactions can differ from a full build
+# by those contact forces. There is nothing to show in an Irrlicht window.
+###############################################################################
+
+def build_bridge(bridge, mode="pseudo-static", params=None, solver=None, lean=False):
+    return build_batch(bridge, mode, [params], solver, lean).models[0]
+
+###############################################################################
+# |BridgeBatch| holds K bridge models that share one ChSystemNSC, see
+# {build_batch}: the shared <system> and the |BridgeModel| of each instance
+# in 'models'.
+###############################################################################
+
+class BridgeBatch:
+    def __init__(self, system, models):
+        self.system = system
+        self.models = models
+
+###############################################################################
+# {build_batch} builds one bridge of type 'bridge' for every parameter
+# dictionary in 'params_list', all in the same ChSystemNSC, side by side along
+# z like the 'num_bridges' scripts meant to: instance k is offset by
+# k*('w'+10), using the widest instance, and all of them stand on one ground
+# sized to fit. The instances share nothing but the system, so each has its
+# own bodies, links and recorder channels, and their reactions are the same
+# as when they are built alone. They do share the time stepping, so
+# 'time_step' and 'time_end' have to be equal across 'params_list'.
+#
+# {build_bridge} is the K = 1 case.
+###############################################################################
+
+def build_batch(bridge, mode="pseudo-static", params_list=(None,), solver=None, lean=False):
+    if mode not in MODES:
+        raise ValueError("Unknown analysis mode '%s' (expected one of %s)"
+                         % (mode, ", ".join(MODES)))
+    all_params = [make_params(params) for params in params_list]
+    for name in ("time_step", "time_end"):
+        if len(set(p[name] for p in all_params)) > 1:
+            raise ValueError("Bridges in one system need the same '%s'" % name)
+    spacing = max(p["w"] for p in all_params) + 10              # z distance between two instances [m]
+    k = len(all_params)
+
+    # Create Chrono system with NSC contact
+    system = chrono.ChSystemNSC()
+    system.Set_G_acc(chrono.ChVectorD(0, -G, 0))
+    solver = solver or SolverConfig()
+    solver.apply(system)
+    mat = chrono.ChMaterialSurfaceNSC()                         # ground material contact system
+
+    # Create ground body, textures it as water, and adds it to system
+    ground = None
+    if not lean:
+        l = max(p["l"] for p in all_params)
+        ground = _box(system, mat, (1.2*l, 1, (k + 4)*spacing), (0, 0, (k - 1)*spacing/2),
+                      "textures/water1.jpg", True)
+        ground.SetName("table")
+
+    models = []
+    for i, p in enumerate(all_params):
+        model = _add_bridge(system, mat, bridge, mode, p, i*spacing, lean)
+        model.solver = solver
+        if ground is not None:
+            model.bodies["ground"] = ground
+        models.append(model)
+    return BridgeBatch(system, models)
+
+def _add_bridge(system, mat, bridge, mode, p, z, lean):        # Adds the pylons, decks and joints/motors of one bridge, offset by 'z'
+    l, w, d = p["l"], p["w"], p["d"]
+    decks, joints = layout(bridge, l, p["leaves"])
+    if mode == "kinematic" and any(rate is None for _, _, _, rate in joints):
+        raise ValueError("The %s has no kinematic mode" % TITLES[bridge])
+    z2x = chrono.Q_from_AngY(0)
+    model = BridgeModel(bridge, mode, p, system)
+    model.lean = lean
+
+    # Creates both pylons centered at -'l'/2 and 'l'/2, textures them as concrete, and adds <py1> and <py2> to the system
+    model.bodies["py1"] = _box(system, mat, (1, 10, w), (-l/2, 5.5, 5 + z), "textures/concrete.jpg", True, lean)
+    model.bodies["py2"] = _box(system, mat, (1, 10, w), (l/2, 5.5, 5 + z), "textures/concrete.jpg", True, lean)
+
+    # Creates the bridge deck(s), each with the mass of its volume of concrete, and adds <deck1>, <deck2>, ... to the system
+    for k, (length, x) in enumerate(decks):
+        deck = _box(system, mat, (length, d, w), (x, DECK_HEIGHT + d/2, 5 + z), "textures/concrete.jpg", False, lean)
+        deck.SetMass(length*w*d*p["rho_c"])
+        model.bodies["deck%d" % (k+1)] = deck
+        model.decks.append(deck)
+
+    # Creates the revolute joints (pseudo-static) or motors (kinematic) <jm1>, <jm2>, ... and adds them to the system
+    for b1, b2, x, rate in joints:
+        pos = chrono.ChVectorD(x, DECK_HEIGHT, 5 + z)
+        if mode == "kinematic":
+            jm = chrono.ChLinkMotorRotationAngle()
+            jm.Initialize(model.bodies[b1], model.bodies[b2], chrono.ChFrameD(pos, z2x))
+            jm.SetAngleFunction(chrono.ChFunction_Ramp(0, rate*p["omg"]))
+        elif mode == "static" and rate is not None:
+            jm = chrono.ChLinkMotorRotationAngle()
+            jm.Initialize(model.bodies[b1], model.bodies[b2], chrono.ChFrameD(pos, z2x))
+            jm.SetAngleFunction(chrono.ChFunction_Const(0))
+        else:
+            jm = chrono.ChLinkLockRevolute()
+            jm.Initialize(model.bodies[b1], model.bodies[b2], chrono.ChCoordsysD(pos, z2x))
+        system.AddLink(jm)
+        model.links.append(jm)
+        body1, body2 = model.bodies[b1], model.bodies[b2]
+        model.hinges.append((body1, body2,
+                             body1.GetFrame_REF_to_abs().TransformPointParentToLocal(pos),
+                             body2.GetFrame_REF_to_abs().TransformPointParentToLocal(pos)))
+
+    return model
+
+def _box(system, mat, size, pos, texture, fixed, lean=False):  # Creates a ChBodyEasyBox of 'size' at 'pos' and adds it to 'system'
+    body = chrono.ChBodyEasyBox(size[0], size[1], size[2], 1000, not lean, not lean, mat)
+    body.SetPos(chrono.ChVectorD(*pos))
+    if not lean:
+        body.GetVisualShape(0).SetTexture(chrono.GetChronoDataFile(texture))
+    body.SetIdentifier(system.GetNbodies())
+    body.SetBodyFixed(fixed)
+    body.SetCollide(not lean)
+    system.Add(body)
+    return body
+
+###############################################################################
+# {constraint_drift} returns the largest distance between the two halves of
+# any hinge of 'model' [m], i.e. how far the solver has let the bodies a joint
+# or motor connects drift apart. It is 0 for an exactly satisfied constraint.
+###############################################################################
+
+def constraint_drift(model):
+    drift = 0.0
+    for body1, body2, local1, local2 in model.hinges:
+        p1 = body1.GetFrame_REF_to_abs().TransformPointLocalToParent(local1)
+        p2 = body2.GetFrame_REF_to_abs().TransformPointLocalToParent(local2)
+        drift = max(drift, (p1 - p2).Length())
+    return drift
+
+###############################################################################
+# {simulate} runs a model for 'time_end' with a time step of 'time_step' and
+# records the reactions at every joint/motor in a |ReactionRecorder|. When a
+# |RenderScheduler| is given the Irrlicht window is redrawn through it,
+# otherwise the run is physics only. When a |SteadyStateMonitor| is given the
+# run stops as soon as it reports that the reactions have settled. When a
+# |PoseRecorder| is given the poses of its bodies are recorded too.
+#
+# The time of every step is read once and shared by the loop condition and
+# the recorders.
+#
+# With an enabled |PhaseTimer| every step is split into the "record",
+# "monitor", "render" and "step" phases of the timer instead; without one
+# the loop below runs untouched.
+###############################################################################
+
+def simulate(model, recorder=None, scheduler=None, monitor=None, timer=None, poses=None):
+    system = model.system
+    time_step = model.params["time_step"]
+    time_end = model.params["time_end"]
+    if recorder is None:
+        recorder = ReactionRecorder(model.links, time_end, time_step)
+    if timer is not None and timer.enabled:
+        return _simulate_timed(model, recorder, scheduler, monitor, timer, poses)
+
+    t = system.GetChTime()
+    while t < time_end:
+        recorder.record(t)
+        if poses is not None:
+            poses.record(t)
+        if monitor is not None and monitor.update(recorder):   # Stops once the reactions have settled
+            break
+        if scheduler is not None and not scheduler.update():   # Stops if the Irrlicht window is closed
+            break
+        system.DoStepDynamics(time_step)
+        t = system.GetChTime()
+
+    return recorder
+
+def _simulate_timed(model, recorder, scheduler, monitor, timer, poses):  # {simulate} with every phase of a step timed
+    system = model.system
+    time_step = model.params["time_step"]
+    time_end = model.params["time_end"]
+    clock = time.perf_counter
+
+    while True:
+        t0 = clock()
+        t = system.GetChTime()
+        if t >= time_end:
+            break
+        recorder.record(t)
+        if poses is not None:
+            poses.record(t)
+        t1 = clock()
+        timer.add("record", t1 - t0)
+        if monitor is not None:
+            settled = monitor.update(recorder)
+            t0, t1 = t1, clock()
+            timer.add("monitor", t1 - t0)
+            if settled:
+                break
+        if scheduler is not None:
+            running = scheduler.update()
+            t0, t1 = t1, clock()
+            timer.add("render", t1 - t0)
+            if not running:
+                break
+        system.DoStepDynamics(time_step)
+        timer.add_step(clock() - t1)
+
+    return recorder
+
+###############################################################################
+# {simulate_batch} runs every bridge of a |BridgeBatch| at once: one
+# DoStepDynamics() of the shared system per step, and one |ReactionRecorder|
+# per instance, returned in the order of 'batch.models'. A batch built in
+# "static" mode is solved with one static analysis instead, which gives the
+# equilibrium of every instance.
+###############################################################################
+
+def simulate_batch(batch, recorders=None):
+    system = batch.system
+    time_step = batch.models[0].params["time_step"]
+    time_end = batch.models[0].params["time_end"]
+    if batch.models[0].mode == "static":
+        solve_static(batch.models[0])
+        recorders = [ReactionRecorder(model.links, 0, time_step) for model in batch.models]
+        for recorder in recorders:
+            recorder.record(system.GetChTime())
+        return recorders
+    if recorders is None:
+        recorders = [ReactionRecorder(model.links, time_end, time_step) for model in batch.models]
+
+    t = system.GetChTime()
+    while t < time_end:
+        for recorder in recorders:
+            recorder.record(t)
+        system.DoStepDynamics(time_step)
+        t = system.GetChTime()
+
+    return recorders
+
+###############################################################################
+# {solve_static} replaces the 'time_end' of dynamics of the pseudo-static mode
+# with one static analysis of a model built in "static" mode. Chrono's linear
+# static solver is used by default; with 'nonlinear' the nonlinear static
+# solver iterates 'nonlinear' times instead. The reactions at the
+# joints/motors are returned as a one sample |ReactionRecorder|, so they can
+# be read from it with {summarize} like the averages of a dynamic run, the
+# motor torques as holding torques (see {build_bridge}).
+###############################################################################
+
+def solve_static(model, nonlinear=0):
+    if model.mode != "static":
+        raise ValueError("solve_static needs a model built in static mode, not %s" % model.mode)
+    system = model.system
+    if nonlinear:
+        system.DoStaticNonlinear(nonlinear)
+    else:
+        system.DoStaticLinear()
+
+    recorder = ReactionRecorder(model.links, 0, model.params["time_step"])
+    recorder.record(system.GetChTime())
+    return recorder
+
+###############################################################################
+# {chrono_version} returns the version of the pychrono in use, for the
+# metadata of benchmark results and the invalidation of cached runs.
+###############################################################################
+
+def chrono_version():
+    version = getattr(chrono, "CHRONO_VERSION", None) or getattr(chrono, "__version__", None)
+    if version is None:
+        try:
+            version = metadata.version("pychrono")
+        except metadata.PackageNotFoundError:                   # Not installed as a Python package, i.e. a conda or source build
+            version = "unknown"
+    return str(version)
+
@@ -0,0 +1,94 @@
+###############################################################################
+# Bridge types, analysis modes, parameters and deck/joint layouts shared by
+# the bridge models.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# Nothing in this file needs pychrono, so the analytical tools can use the
+# same layouts and parameters as the Chrono models on machines without it.
+###############################################################################
+
+import math
+
+#------------------------------------------------------------------------------
+########################## Bridge types and parameters ########################
+#------------------------------------------------------------------------------
+
+BRIDGE_TYPES = ("static", "drawbridge", "bascule", "folding")
+MODES = ("pseudo-static", "kinematic", "static")
+
+TITLES = {"static": "static bridge",                            # Window titles and plot file names used by the scripts
+          "drawbridge": "draw bridge",
+          "bascule": "bascule bridge",
+          "folding": "folding bridge"}
+
+DEFAULTS = {"l": 152.4,                                         # length of bridge in [m] (500 ft)
+            "w": 22.86,                                         # width of bridge in [m] (75 ft)
+            "d": .3048,                                         # depth of bridge in [m] (12 in)
+            "rho_c": 2500,                                      # density of concrete in [kg/m^3] (156.07 lb/ft^3)
+            "time_step": 2e-3,                                  # time step of simulation [s]
+            "time_end": 15,                                     # end time of simulation [s]
+            "omg": None,                                        # rotational velocity of motors [rad/s], pi/(2*'time_end') if None
+            "leaves": 3}                                        # number of leaves of the folding bridge
+
+G = 9.81                                                        # gravitational acceleration in [m/s^2]
+DECK_HEIGHT = 10                                                # height of the joints/motors and bottom of the decks [m]
+
+###############################################################################
+# {make_params} returns a full parameter dictionary, i.e. 'DEFAULTS' updated
+# with 'overrides'. Unknown parameter names raise a ValueError so a typo in a
+# sweep grid does not silently run the default model. 'omg' defaults to
+# pi/(2*'time_end') like in the scripts, so the motors turn the decks 90
+# degrees over the run.
+###############################################################################
+
+def make_params(overrides=None):
+    params = dict(DEFAULTS)
+    for name, value in (overrides or {}).items():
+        if name not in DEFAULTS:
+            raise ValueError("Unknown bridge parameter '%s' (expected one of %s)"
+                             % (name, ", ".join(DEFAULTS)))
+        params[name] = value
+    if params["omg"] is None:
+        params["omg"] = math.pi/(2*params["time_end"])
+    return params
+
+###############################################################################
+# {layout} describes the decks and the joints/motors of each bridge type:
+#
+#   decks  - list of (length, x position of the center) for each deck
+#   joints - list of (body 1, body 2, x position, motor rate) for each
+#            joint/motor <jmX>. The motor rate is a multiple of 'omg' and is
+#            None when the bridge has no kinematic mode.
+#
+# The folding bridge has 'leaves' decks of 'l'/'leaves' hinged to each other
+# in a chain, the first one at <py1>. Its motor rates alternate -1, 2, -2, 2,
+# ... so the first leaf rises and every following one folds back against the
+# one before it, in a zig-zag. With the default of 3 leaves this is the model
+# of folding_with_motors.py.
+###############################################################################
+
+def layout(bridge, l, leaves=DEFAULTS["leaves"]):
+    if bridge == "static":                                      # 1 deck over the full span, pinned at both pylons
+        decks = [(l, 0)]
+        joints = [("py1", "deck1", -l/2, None),
+                  ("py2", "deck1", l/2, None)]
+    elif bridge == "drawbridge":                                # 1 deck over the full span, hinged at the first pylon
+        decks = [(l, 0)]
+        joints = [("py1", "deck1", -l/2, -1)]
+    elif bridge == "bascule":                                   # 2 decks of l/2, each hinged at its pylon
+        decks = [(l/2, -l/4), (l/2, l/4)]
+        joints = [("py1", "deck1", -l/2, -1),
+                  ("py2", "deck2", l/2, 1)]
+    elif bridge == "folding":                                   # 'leaves' decks of l/'leaves' hinged to each other in a chain
+        n = int(leaves)
+        if n < 1 or n != leaves:
+            raise ValueError("A folding bridge needs a whole number of leaves, not %s" % leaves)
+        decks = [(l/n, -l/2 + (k + 0.5)*l/n) for k in range(n)]
+        joints = [("py1", "deck1", -l/2, -1)]
+        joints += [("deck%d" % k, "deck%d" % (k+1), -l/2 + k*l/n, 2*(-1)**(k+1)) for k in range(1, n)]
+    else:
+        raise ValueError("Unknown bridge type '%s' (expected one of %s)"
+                         % (bridge, ", ".join(BRIDGE_TYPES)))
+    return decks, joints
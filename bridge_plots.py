@@ -0,0 +1,36 @@
+###############################################################################
+# Matplotlib plots of the reaction histories of the bridge runs.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# Nothing in this file needs pychrono: the plots take anything with 'time',
+# 'force', 'torque' and 'names', i.e. a |ReactionRecorder| during a run or a
+# |StoredRun| read back from disk.
+###############################################################################
+
+import matplotlib.pyplot as plt
+
+###############################################################################
+# {plot_history} plots the reaction forces of each joint/motor in a panel of
+# its own and the reaction torques about z of all of them in a last panel,
+# like the model scripts do, titles the figure 'title' and saves it to 'path'.
+# The figure is returned so the caller can show or close it. Only the samples
+# from 'start' on are drawn, i.e. after the startup transient found by
+# {transient_end}, so the axes are scaled to the part of the run that matters.
+###############################################################################
+
+def plot_history(rec, title, path, start=0):
+    n = len(rec.names)
+    time = rec.time[start:]
+    fig, axes = plt.subplots(n + 1, sharex=True)
+    for k in range(n):
+        axes[k].plot(time, rec.force[start:, k])
+        axes[k].set(ylabel='Reaction Force [N]')
+        axes[k].grid()
+    axes[n].plot(time, rec.torque[start:, :, 2])
+    axes[n].set(ylabel='Reaction Torque [Nm]', xlabel='Time [s]')
+    axes[n].grid()
+    fig.suptitle(title)
+    fig.savefig(path)
+    return fig
@@ -0,0 +1,249 @@
+###############################################################################
+# Parallel parameter sweeps over the bridge models.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# A sweep takes a bridge type, an analysis mode and a grid of parameter values
+# (any of 'l', 'w', 'd', 'rho_c', 'time_step', 'time_end' and 'omg'). Every
+# combination of the grid is built as its own ChSystemNSC with
+# {build_bridge} and run headless in a process pool sized to the number of
+# cores. The summary of each run (average, peak, RMS and percentiles of the
+# reaction and torque at each joint/motor, see {summarize}) is collected into a single table, one row per
+# point, that can be written to a CSV file.
+#
+# Example, 4 spans times 3 deck depths of the kinematic bascule bridge:
+#
+#   python bridge_sweep.py bascule --mode kinematic --set l=100,125,152.4,175
+#       --set d=0.3048,0.4,0.5 --out bascule_sweep.csv
+###############################################################################
+
+import os
+import csv
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from bridge_params import BRIDGE_TYPES, MODES, TITLES, make_params
+from convergence import SteadyStateMonitor
+from result_cache import ResultCache
+from solver_config import SolverConfig
+
+###############################################################################
+# {expand_grid} turns a grid, i.e. {"l": [100, 150], "d": [.3, .6]}, into the
+# list of every combination of its values, i.e. [{"l": 100, "d": .3},
+# {"l": 100, "d": .6}, ...]. The last parameter varies fastest.
+###############################################################################
+
+def expand_grid(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+###############################################################################
+# {run_point} builds and runs one point of a sweep and returns its row of the
+# results table: the bridge type, the mode, every model parameter, the
+# summary of the reactions and the wall-clock time of the run [s]. Points of
+# the "static" mode are solved with {solve_static} instead of being run. With
+# 'steady_rtol' the run stops once a |SteadyStateMonitor| with that tolerance
+# reports settled reactions, and the row also gets the time they settled at
+# and the simulated time saved. 'solver' is the |SolverConfig| of the model,
+# and 'lean' builds it without visual shapes or collision (see
+# {build_bridge}). With a 'cache' directory the point is looked up in a
+# |ResultCache| there first and only run, and stored, if it is not in it; the
+# row then says whether it was "cached". Runs that stop early on
+# 'steady_rtol' are not cached. {run_sweep} checks the Chrono version of the
+# cache once and runs the points with 'check_chrono' off.
+#
+# With 'reuse' the model is taken from the |SystemPool| of the worker
+# process, which only builds it if no earlier point of that process had the
+# same topology, and the row says whether it was "reused". Only points that
+# are run here on their own are reused: a cached point is run by the
+# |ResultCache| and a batch by {run_batch}, each on a model of its own, so
+# 'reuse' cannot be combined with 'cache', nor with a 'batch' of {run_sweep}.
+#
+# It runs in the worker processes, so it has to stay a module level
+# function. Chrono is only imported by the functions that run a model, so the
+# helpers of this file can be used without it.
+###############################################################################
+
+_pool = None                                                    # |SystemPool| of this worker process, made on first use
+
+def run_point(bridge, mode, params, steady_rtol=None, solver=None, lean=False, cache=None, reuse=False,
+              check_chrono=True):
+    import bridge_models
+    from system_pool import SystemPool
+
+    if cache and reuse:
+        raise ValueError("A cached point is run on a model of its own, so cache and reuse cannot be combined")
+    start = time.perf_counter()
+    if cache and not steady_rtol:
+        results = ResultCache(cache, check_chrono=check_chrono)
+        run = results.run(bridge, mode, params, solver, lean)
+        row = {"bridge": bridge, "mode": mode, "solver": (solver or SolverConfig()).label, "lean": lean}
+        row.update(run.meta["params"])
+        row.update(run.meta["summary"])
+        row["cached"] = results.hits > 0
+        row["wall_time"] = time.perf_counter() - start
+        return row
+
+    global _pool
+    if reuse:
+        if _pool is None:
+            _pool = SystemPool()
+        reuses = _pool.reuses
+        model = _pool.get(bridge, mode, params, solver, lean)
+    else:
+        model = bridge_models.build_bridge(bridge, mode, params, solver, lean)
+    monitor = None
+    if mode == "static":
+        rec = bridge_models.solve_static(model)
+    else:
+        if steady_rtol:
+            monitor = SteadyStateMonitor(rtol=steady_rtol)
+        rec = bridge_models.simulate(model, monitor=monitor)
+
+    row = {"bridge": bridge, "mode": mode, "solver": model.solver.label, "lean": lean}
+    row.update(model.params)
+    row.update(bridge_models.summarize(rec, mode))
+    if monitor is not None:
+        row["settled_at"] = monitor.settled_at
+        row["time_saved"] = monitor.time_saved(model.params["time_end"])
+    if reuse:
+        row["reused"] = _pool.reuses > reuses
+    row["wall_time"] = time.perf_counter() - start
+    return row
+
+###############################################################################
+# {run_batch} builds and runs several points of a sweep as the instances of
+# one shared system with {build_batch}, and returns their rows like
+# {run_point}. The wall-clock time of the batch is split evenly over its
+# rows. It runs in the worker processes too.
+###############################################################################
+
+def run_batch(bridge, mode, points, solver=None, lean=False):
+    import bridge_models
+
+    start = time.perf_counter()
+    batch = bridge_models.build_batch(bridge, mode, points, solver, lean)
+    recorders = bridge_models.simulate_batch(batch)
+    wall_time = (time.perf_counter() - start)/len(points)
+    summaries = bridge_models.summarize_batch(recorders, mode)  # All instances in one pass
+
+    rows = []
+    for model, summary in zip(batch.models, summaries):
+        row = {"bridge": bridge, "mode": mode, "solver": model.solver.label, "lean": lean,
+               "batch": len(points)}
+        row.update(model.params)
+        row.update(summary)
+        row["wall_time"] = wall_time
+        rows.append(row)
+    return rows
+
+###############################################################################
+# {run_sweep} runs every point of 'grid' for the given bridge type and mode on
+# 'workers' processes (all cores by default) and returns the rows in the
+# order of {expand_grid}. Parameters are checked before any process starts.
+# 'steady_rtol', 'solver', 'lean', 'cache' and 'reuse' are passed on to
+# {run_point}. With 'reuse' every process gets one contiguous block of the
+# points, so neighbouring points that share a topology (the parameters given
+# last vary fastest in {expand_grid}) share a model.
+#
+# With 'batch' K > 1 every process runs K points at once in one system with
+# {run_batch}, which saves a Python round trip per step for every point but
+# the first. Points of a batch share the time stepping, so 'time_step' and
+# 'time_end' cannot be swept, and a batch cannot stop early on 'steady_rtol'.
+# Batches are not cached and do not reuse models, so 'batch' cannot be
+# combined with 'cache' or 'reuse', nor 'cache' with 'reuse'.
+###############################################################################
+
+def run_sweep(bridge, mode, grid, workers=None, steady_rtol=None, solver=None, lean=False, batch=1,
+              cache=None, reuse=False):
+    points = expand_grid(grid)
+    for point in points:
+        make_params(point)
+
+    workers = workers or os.cpu_count() or 1
+    if cache and reuse:
+        raise ValueError("A cached point is run on a model of its own, so cache and reuse cannot be combined")
+    if batch > 1:
+        if steady_rtol:
+            raise ValueError("A batch of bridges cannot stop early on steady_rtol")
+        if cache or reuse:
+            raise ValueError("A batch of bridges is neither cached nor run on reused models")
+        chunks = [points[i:i+batch] for i in range(0, len(points), batch)]
+        n = len(chunks)
+        with ProcessPoolExecutor(max_workers=min(workers, n)) as pool:
+            return [row for rows in pool.map(run_batch, [bridge]*n, [mode]*n, chunks, [solver]*n, [lean]*n)
+                    for row in rows]
+
+    n = len(points)
+    workers = min(workers, n)
+    chunksize = -(-n//workers) if reuse else 1
+    if cache and not steady_rtol:                               # Checks the Chrono version once, before any worker uses the cache
+        ResultCache(cache)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_point, [bridge]*n, [mode]*n, points, [steady_rtol]*n, [solver]*n, [lean]*n,
+                             [cache]*n, [reuse]*n, [False]*n, chunksize=chunksize))
+
+def write_table(rows, path):                                    # Writes the rows of a sweep to a CSV file
+    fields = []
+    for row in rows:
+        fields += [name for name in row if name not in fields]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def parse_grid(items):                                          # Turns ["l=100,150", "d=.3"] into {"l": [100.0, 150.0], "d": [0.3]}
+    grid = {}
+    for item in items:
+        name, _, values = item.partition("=")
+        if not values:
+            raise ValueError("Expected NAME=VALUE[,VALUE...], got '%s'" % item)
+        grid[name.strip()] = [float(v) for v in values.split(",")]
+    return grid
+
+#------------------------------------------------------------------------------
+############################### Command line ##################################
+#------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a parameter sweep of a bridge model on all cores.")
+    parser.add_argument("bridge", choices=BRIDGE_TYPES)
+    parser.add_argument("--mode", choices=MODES, default="pseudo-static")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="values of one parameter (l, w, d, rho_c, time_step, time_end, omg), repeatable")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all cores)")
+    parser.add_argument("--steady-rtol", type=float, default=None,
+                        help="stop each run once its reactions settle within this relative tolerance")
+    parser.add_argument("--solver", type=SolverConfig.parse, default=None, metavar="solver=NAME,max_iters=N,...",
+                        help="solver settings of every run (solver, max_iters, tol, timestepper)")
+    parser.add_argument("--lean", action="store_true",
+                        help="build the models without visual shapes, textures or collision")
+    parser.add_argument("--batch", type=int, default=1,
+                        help="number of points each process runs together in one system")
+    parser.add_argument("--cache", default=None, metavar="DIR",
+                        help="reuse runs stored in this result cache, and store new ones in it")
+    parser.add_argument("--reuse", action="store_true",
+                        help="reset and rerun the models of earlier points with the same geometry instead of "
+                             "building them again (not with --cache or --batch, which build their own models)")
+    parser.add_argument("--out", default=None, help="CSV file for the results table")
+    args = parser.parse_args(argv)
+
+    if args.batch > 1 and (args.cache or args.reuse):           # Batches are not cached and build their own system
+        parser.error("--batch cannot be combined with --cache or --reuse")
+    if args.cache and args.reuse:
+        parser.error("--cache cannot be combined with --reuse")
+    grid = parse_grid(args.set)
+    start = time.perf_counter()
+    rows = run_sweep(args.bridge, args.mode, grid, args.workers, args.steady_rtol, args.solver, args.lean,
+                     args.batch, args.cache, args.reuse)
+    print("Ran %d points in %.1f s" % (len(rows), time.perf_counter() - start))
+
+    out = args.out or "%s - %s sweep.csv" % (TITLES[args.bridge], args.mode)
+    write_table(rows, out)
+    print("Results written to", out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+###############################################################################
+# Shared Irrlicht helpers for the bridge models.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# pychrono.irrlicht is only imported when a window is opened, so the models 
+# can import this file even when they are run headless.
+###############################################################################
+
+import time
+
+###############################################################################
+# {open_window} creates the Irrlicht window the models use, attached to
+# 'system' and titled 'title', with the camera looking down the bridge.
+###############################################################################
+
+def open_window(system, title):
+    import pychrono as chrono
+    import pychrono.irrlicht as chronoirr
+
+    vis = chronoirr.ChVisualSystemIrrlicht()
+    vis.AttachSystem(system)
+    vis.SetWindowSize(1024,768)
+    vis.SetWindowTitle(title)
+    vis.Initialize()
+    vis.AddSkyBox()
+    vis.AddCamera(chrono.ChVectorD(-200, 0, 3))
+    vis.AddTypicalLights()
+    return vis
+
+###############################################################################
+# |RenderScheduler| decouples the Irrlicht render from the physics step. With
+# a 'time_step' of 2e-3 s the models used to render 500 frames per simulated
+# second, which is far more than any screen shows. The scheduler is called
+# once per physics step with {update} and only renders when a frame is due:
+#
+#   - every 1/'fps' seconds of wall-clock time (default), or
+#   - every 'every' physics steps if 'every' is given.
+#
+# Every 'report' seconds of wall-clock time the achieved frame rate and the
+# number of physics steps per second are printed to the console.
+#
+# {update} returns False once the Irrlicht window has been closed so the
+# stepping loop can stop.
+###############################################################################
+
+class RenderScheduler:
+    def __init__(self, vis, fps=30, every=None, report=2.0):
+        self.vis = vis                                          # Irrlicht visual system attached to the model
+        self.every = every                                      # render every Nth physics step if set
+        self.frame_dt = 1/fps                                   # wall-clock time between frames [s]
+        self.report = report                                    # wall-clock time between console reports [s]
+        self.steps = 0                                          # physics steps since the last report
+        self.frames = 0                                         # frames rendered since the last report
+        self.count = 0                                          # physics steps since the scheduler was created
+        now = time.perf_counter()
+        self.last_frame = now - self.frame_dt                   # renders the first frame straight away
+        self.last_report = now
+
+    def update(self):
+        self.steps += 1
+        self.count += 1
+        now = time.perf_counter()
+
+        if self.every:
+            due = (self.count - 1) % self.every == 0
+        else:
+            due = now - self.last_frame >= self.frame_dt
+
+        if due:
+            if not self.vis.Run():                              # Window was closed, tell the loop to stop
+                return False
+            self.vis.BeginScene()
+            self.vis.Render()
+            self.vis.EndScene()
+            self.frames += 1
+            self.last_frame = now
+
+        elapsed = now - self.last_report
+        if self.report and elapsed >= self.report:
+            print("Render: %.1f FPS, physics: %.0f steps/s"
+                  % (self.frames/elapsed, self.steps/elapsed))
+            self.steps = 0
+            self.frames = 0
+            self.last_report = now
+
+        return True
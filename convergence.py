@@ -0,0 +1,133 @@
+###############################################################################
+# Steady-state detection for the bridge runs.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+###############################################################################
+
+import numpy as np
+
+###############################################################################
+# |SteadyStateMonitor| watches the reactions a |ReactionRecorder| collects
+# and tells the stepping loop to stop once they have settled, instead of
+# running every pseudo-static case to 'time_end' long after
+# Get_react_force() has stopped changing.
+#
+# Every 'check_every' samples it looks at the last 'window' seconds of the
+# recorded forces and torques, once per sample count even when a recorder
+# thinned during the warmup keeps its count for several steps. The run has settled when, for every channel,
+#
+#   - the standard deviation over the window, and
+#   - the change of the mean between the two halves of the window
+#
+# are both within 'atol' + 'rtol' times the largest mean force (for the force
+# channels) or the largest mean torque (for the torque channels). Using the
+# largest mean as the scale keeps channels that sit at zero, i.e. the torque
+# at a revolute pin, from never settling. No check is done before 'min_time'.
+#
+# A deck swinging on a free revolute hinge never settles, so the monitor
+# simply lets such runs go to 'time_end'.
+###############################################################################
+
+class SteadyStateMonitor:
+    def __init__(self, rtol=1e-3, window=1.0, atol=0.0, check_every=50, min_time=0.0):
+        self.rtol = rtol                                        # relative tolerance on the reactions [-]
+        self.atol = atol                                        # absolute tolerance on the reactions [N] or [Nm]
+        self.window = window                                    # length of the sliding window [s]
+        self.check_every = check_every                          # samples between two checks
+        self.min_time = min_time                                # earliest time the run may stop [s]
+        self.settled_at = None                                  # time at which the reactions settled [s]
+        self._last_n = None                                     # sample count of the last check
+
+    def update(self, recorder):                                 # Returns True once the recorded reactions have settled
+        n = recorder.count
+        if n % self.check_every or n == self._last_n:           # A thinned recorder keeps its count for several steps
+            return False
+        self._last_n = n
+        time = recorder.time
+        t = time[-1]
+        if t < self.min_time or t - time[0] < self.window:
+            return False
+
+        start = np.searchsorted(time, t - self.window)
+        if len(time) - start < 4:
+            return False
+        for channel in (recorder.force[start:], recorder.torque[start:]):
+            if not self._settled(channel):
+                return False
+
+        self.settled_at = t
+        return True
+
+    def _settled(self, channel):
+        half = len(channel)//2
+        mean = channel.mean(axis=0)
+        tol = self.atol + self.rtol*np.max(np.abs(mean))
+        spread = channel.std(axis=0)
+        drift = np.abs(channel[:half].mean(axis=0) - channel[half:].mean(axis=0))
+        return bool(np.all(spread <= tol) and np.all(drift <= tol))
+
+    def time_saved(self, time_end):                             # Simulated time that did not have to be run [s]
+        if self.settled_at is None:
+            return 0.0
+        return max(time_end - self.settled_at, 0.0)
+
+    def report(self, time_end):
+        if self.settled_at is None:
+            return "Reactions did not settle before %g s" % time_end
+        return ("Reactions settled at %.3f s, %.3f s of the %g s run saved"
+                % (self.settled_at, self.time_saved(time_end), time_end))
+
+###############################################################################
+# {transient_end} finds where the startup transient of a run ends from its
+# recorded reactions, so the averages and plots no longer need a hand-picked
+# window like 'plt.xlim(0.2, 14.8)'. It uses a moving-variance criterion:
+#
+#   - the standard deviation of every channel is computed over a window of
+#     'window' seconds starting at every sample, with running sums,
+#   - each is divided by the largest mean force or torque over the second
+#     half of the run (the scale of |SteadyStateMonitor|), and the largest
+#     over the channels is kept,
+#   - a window is noisy when that spread is above 'factor' times its median
+#     over the run (and above 'rtol'),
+#
+# and the transient ends after the last noisy window that starts in the first
+# 'max_fraction' of the run. A steady swing of a free deck has the same
+# spread everywhere and gives no transient; a late event, i.e. a deck hitting
+# its pylon, is not mistaken for one.
+#
+# Returns the index of the first sample after the transient (0 if there is
+# none). 'time' is (samples,) and 'force' and 'torque' (samples, links, 3),
+# or all of them stacked along a first axis of runs, in which case one index
+# per run is returned.
+###############################################################################
+
+def transient_end(time, force, torque, window=0.2, factor=3.0, rtol=1e-3, max_fraction=0.5):
+    time, force, torque = np.asarray(time), np.asarray(force), np.asarray(torque)
+    lead = force.shape[:-3]                                     # () for one run, (runs,) for a stack
+    n = force.shape[-3]
+    dt = np.median(np.diff(time, axis=-1)) if n > 1 else 0.0
+    w = max(int(round(window/dt)), 2) if dt > 0 else 2         # samples per window
+    if n < 2*w:
+        return np.zeros(lead, int) if lead else 0
+
+    spread = None
+    for channel in (force, torque):
+        c = channel.reshape(lead + (n, -1))
+        tail = c[..., n//2:, :].mean(axis=-2, keepdims=True)
+        scale = np.max(np.abs(tail), axis=-1)                   # (..., 1)
+        c = c - tail                                            # Centered, so the running sums do not cancel out
+        zero = np.zeros(lead + (1, c.shape[-1]))
+        s1 = np.concatenate([zero, np.cumsum(c, axis=-2)], axis=-2)
+        s2 = np.concatenate([zero, np.cumsum(c**2, axis=-2)], axis=-2)
+        mean = (s1[..., w:, :] - s1[..., :-w, :])/w
+        var = (s2[..., w:, :] - s2[..., :-w, :])/w - mean**2
+        std = np.sqrt(np.maximum(var, 0.0)).max(axis=-1)        # (..., windows)
+        std = np.where(scale > 0, std/np.where(scale > 0, scale, 1.0), 0.0)
+        spread = std if spread is None else np.maximum(spread, std)
+
+    threshold = np.maximum(factor*np.median(spread, axis=-1), rtol)
+    limit = max(min(int(max_fraction*n), spread.shape[-1]), 1)
+    noisy = spread[..., :limit] > threshold[..., None]
+    end = np.where(noisy.any(axis=-1), limit - np.argmax(noisy[..., ::-1], axis=-1), 0)
+    return end if lead else int(end)
@@ -0,0 +1,184 @@
+###############################################################################
+# Inverse dynamics of the kinematic bridge runs.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# In the kinematic mode every deck follows the angle the ChFunction_Ramp of
+# its motor prescribes, so the motion is known before anything is simulated
+# and the motor torques and joint reactions follow from it directly: one
+# Newton-Euler pass down the chain of decks (their accelerations) and one
+# back up it (the forces and torques every joint has to apply). Both passes
+# are NumPy operations over all time samples at once, so the torque curve of
+# a new profile takes milliseconds instead of a 15 s Chrono run.
+#
+# Geometry, masses and angles come from bridge_analytic.py, with its sign
+# conventions: 'force' is the force a joint applies to the deck it carries
+# and 'torque' the torque about z it applies, counter-clockwise positive.
+# Unlike {reactions} there, the decks are also accelerated, and each has the
+# moment of inertia {build_bridge} gives it.
+###############################################################################
+
+import sys
+import time
+import numpy as np
+
+from bridge_analytic import _chain, deck_masses, leaf_angles
+from bridge_params import BRIDGE_TYPES, DEFAULTS, G, make_params
+
+EASYBOX_DENSITY = 1000                                          # density the decks' ChBodyEasyBox inertias are computed with [kg/m^3]
+
+###############################################################################
+# {ramp_profile} returns the angle [rad], angular velocity [rad/s] and
+# angular acceleration [rad/s^2] of every deck at times 't' of a kinematic
+# run, each of shape (..., decks). The ramps turn every deck at a constant
+# rate, so the acceleration is zero after the start.
+###############################################################################
+
+def ramp_profile(bridge, t, omg, leaves=DEFAULTS["leaves"]):
+    angles = leaf_angles(bridge, t, omg, leaves)
+    omega = np.broadcast_to(leaf_angles(bridge, 1.0, omg, leaves), angles.shape)
+    return angles, omega, np.zeros(angles.shape)
+
+def _cross(r, f):                                               # z component of the cross product of two xy vectors
+    return r[..., 0]*f[..., 1] - r[..., 1]*f[..., 0]
+
+###############################################################################
+# {inverse_dynamics} returns the reactions of the joints/motors of 'bridge'
+# moving its decks along 'profile' (the (angles, omega, alpha) of
+# {ramp_profile} for the motors' ramps at 'omg' by default, or any other
+# profile of the same shapes) at times 't'. Array parameters broadcast
+# against the samples like they do in {reactions}:
+#
+#   force  - shape (..., joints, 2) [N]
+#   torque - shape (..., joints) [Nm], the motor torques
+#
+# Each deck i carried by joint k, with mass m, inertia I about its center,
+# center acceleration a and the vector r from the joint to its center, needs
+#
+#   F_k = m (a - g) + sum of F_c
+#   T_k = I alpha + r x m (a - g) + sum of ((h_c - h_k) x F_c + T_c)
+#
+# over the joints c it carries, at h_c (h_k is joint k).
+###############################################################################
+
+def inverse_dynamics(bridge, t, l=DEFAULTS["l"], w=DEFAULTS["w"], d=DEFAULTS["d"], rho_c=DEFAULTS["rho_c"],
+                     omg=None, leaves=DEFAULTS["leaves"], profile=None, g=G):
+    lengths, centers, xs, child, parent, _, pinned = _chain(bridge, leaves)
+    if pinned:
+        raise ValueError("The static span has no kinematic mode")
+    if omg is None:
+        omg = make_params()["omg"]
+    angles, omega, alpha = profile if profile is not None else ramp_profile(bridge, t, omg, leaves)
+    mass = deck_masses(bridge, l, w, d, rho_c, leaves)
+    shape = np.broadcast_shapes(np.shape(angles), mass.shape)
+    angles, omega, alpha, mass = (np.broadcast_to(a, shape) for a in (angles, omega, alpha, mass))
+    l, w, d = (np.asarray(a, dtype=float) for a in (l, w, d))
+    span = l[..., None]*lengths                                 # length of every deck [m]
+    inertia = EASYBOX_DENSITY*span*w[..., None]*d[..., None]*(span**2 + d[..., None]**2)/12
+    cos, sin = np.cos(angles), np.sin(angles)
+    gravity = np.array([0.0, -g])
+
+    def rotate(i, x, y):                                        # Vector (x, y) of deck i's frame in the absolute frame
+        return np.stack([cos[..., i]*x - sin[..., i]*y, sin[..., i]*x + cos[..., i]*y], axis=-1)
+
+    def accelerate(i, r):                                       # Acceleration of the point 'r' from the joint of deck i, relative to it
+        spin = alpha[..., i, None]*np.stack([-r[..., 1], r[..., 0]], axis=-1)
+        return spin - omega[..., i, None]**2*r
+
+    # Down the chain: position of every joint and acceleration of every joint and deck center
+    n_joints = len(xs)
+    hinge, hinge_acc, arm, load = {}, {}, {}, {}
+    carried = {}
+    for k, (i, j) in enumerate(zip(child, parent)):
+        carried[i] = k
+        if j < 0:                                               # Joint on a pylon, fixed
+            hinge[k] = np.stack(np.broadcast_arrays(xs[k]*l, 0.0), axis=-1)
+            hinge_acc[k] = np.zeros(np.shape(hinge[k]))
+        else:                                                   # Joint on deck j, moving with it
+            o = rotate(j, (xs[k] - xs[carried[j]])*l, 0.0)
+            hinge[k] = hinge[carried[j]] + o
+            hinge_acc[k] = hinge_acc[carried[j]] + accelerate(j, o)
+        arm[k] = rotate(i, (centers[i] - xs[k])*l, d/2)
+        load[k] = mass[..., i, None]*(hinge_acc[k] + accelerate(i, arm[k]) - gravity)
+
+    # Up the chain: every joint carries its deck and the joints further down
+    force = np.zeros(shape[:-1] + (n_joints, 2))
+    torque = np.zeros(shape[:-1] + (n_joints,))
+    for k in reversed(range(n_joints)):
+        i = child[k]
+        f = load[k]
+        tau = inertia[..., i]*alpha[..., i] + _cross(arm[k], load[k])
+        for c in range(n_joints):
+            if parent[c] == i:
+                f = f + force[..., c, :]
+                tau = tau + _cross(hinge[c] - hinge[k], force[..., c, :]) + torque[..., c]
+        force[..., k, :] = f
+        torque[..., k] = tau
+    return force, torque
+
+###############################################################################
+# |InverseDynamicsRun| holds the reactions of {inverse_dynamics} at times
+# 'time' like a |ReactionRecorder| does ('time', 'force' and 'torque' of
+# shape (samples, links, 3), 'names'), so {summarize}, {plot_history} and
+# {write_history} take it as they take a Chrono run. {run_inverse} makes one
+# for the kinematic run 'params' describes, at every time step by default.
+###############################################################################
+
+class InverseDynamicsRun:
+    def __init__(self, time, force, torque):
+        n = force.shape[-2]
+        self.time = np.asarray(time, dtype=float)
+        self.force = np.zeros(force.shape[:-1] + (3,))
+        self.force[..., :2] = force
+        self.torque = np.zeros(self.force.shape)
+        self.torque[..., 2] = torque
+        self.names = ["jm%d" % (k+1) for k in range(n)]
+
+def run_inverse(bridge, params=None, time=None):
+    p = make_params(params)
+    if time is None:
+        time = np.arange(0.0, p["time_end"], p["time_step"])
+    force, torque = inverse_dynamics(bridge, time, p["l"], p["w"], p["d"], p["rho_c"], p["omg"], p["leaves"])
+    return InverseDynamicsRun(time, force, torque)
+
+###############################################################################
+# {validate} runs 'bridge' in the kinematic mode with the lean Chrono model,
+# which has no collision, so the contact of the decks with the pylon tops
+# does not load the motors there either. It compares the reaction force
+# magnitude and torque about z at every motor with {inverse_dynamics} at the
+# same times, after the startup transient (the ramps start the decks with a
+# jump in velocity, which Chrono resolves over a few steps). Returns (name, largest Chrono value, largest error, error
+# relative to the largest value) rows. The Chrono reactions are measured in
+# the link frames, so only magnitudes are compared.
+###############################################################################
+
+def validate(bridge, params=None):
+    import bridge_models
+    from convergence import transient_end
+
+    model = bridge_models.build_bridge(bridge, "kinematic", params, lean=True)
+    rec = bridge_models.simulate(model)
+    start = transient_end(rec.time, rec.force, rec.torque)
+    run = run_inverse(bridge, model.params, rec.time[start:])
+
+    rows = []
+    for k, name in enumerate(rec.names):
+        checks = [(name + " force", np.linalg.norm(rec.force[start:, k], axis=-1),
+                   np.linalg.norm(run.force[:, k], axis=-1)),
+                  (name + " torque", np.abs(rec.torque[start:, k, 2]), np.abs(run.torque[:, k, 2]))]
+        for label, chrono_value, value in checks:
+            scale = max(np.max(chrono_value), 1e-9)
+            error = np.max(np.abs(chrono_value - value))
+            rows.append((label, scale, error, error/scale))
+    return rows
+
+if __name__ == "__main__":
+    for bridge in BRIDGE_TYPES[1:]:                             # Every bridge type with a kinematic mode
+        start = time.perf_counter()
+        run = run_inverse(bridge)
+        print("%s: %d samples in %.2f ms" % (bridge, len(run.time), 1e3*(time.perf_counter() - start)))
+        if "--validate" in sys.argv:
+            for label, peak, error, relative in validate(bridge):
+                print("  %-12s Chrono peak %14.6g  max. error %12.4g  rel. error %.2e"
+                      % (label, peak, error, relative))
@@ -0,0 +1,249 @@
+###############################################################################
+# Staged, re-runnable pipeline of the bridge runs.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# The scripts compute the averages and draw the plots straight after the
+# stepping loop, so changing a plot or adding a statistic means running the
+# simulation again. Here every run goes through four stages, each of which
+# reads what the one before it wrote to the run's directory:
+#
+#   build     - build.json    resolved parameters, decks, joints and masses
+#   simulate  - reactions/    time history of the reactions and of the deck
+#                             poses, a |ResultStore| streamed while the
+#                             model runs (the "record" step; a Chrono system
+#                             cannot be saved and stepped later, so
+#                             recording is part of the run)
+#   analyze   - analysis.json statistics of every joint/motor, see
+#                             {reaction_stats}
+#   plot      - plot.png      time history plot after the startup transient,
+#                             see {plot_history}; none for a static run,
+#                             which has no time history
+#
+# Each stage has a stamp: the sha256 of the stamp of the stage before it (the
+# run definition for "build"), of its own function and of the source files it
+# depends on. stamps.json keeps the stamps the outputs were made with, and a
+# stage is only run again when its stamp changed, its output is missing, a
+# stage before it ran, or it is forced. Editing {analyze} therefore reruns
+# "analyze" and "plot" of every run of a sweep in seconds, and leaves the
+# simulations alone; editing bridge_models.py reruns every stage from
+# "simulate" on. Only "simulate" imports Chrono, so the other stages can be
+# rerun over stored runs on a machine without it.
+#
+#   python pipeline.py bascule --mode kinematic --set l=100,125,150 --set d=.3,.4
+#   python pipeline.py bascule --mode kinematic --set l=100,125,150 --set d=.3,.4 --force plot
+#
+# The second call only redraws the plots. Both write summary.csv, one row per
+# run, from the analysis.json files.
+###############################################################################
+
+import os
+import sys
+import json
+import time
+import hashlib
+import inspect
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from bridge_params import BRIDGE_TYPES, MODES, TITLES, layout, make_params
+from bridge_plots import plot_history
+from bridge_sweep import expand_grid, parse_grid, write_table
+from pose_recorder import PoseRecorder
+from reaction_recorder import ReactionRecorder
+from reaction_stats import summarize
+from result_cache import cache_key
+from result_store import ResultStore, StoredRun
+from solver_config import SolverConfig
+
+STAGES = ("build", "simulate", "analyze", "plot")
+POSE_EVERY = 10                                                 # steps per recorded deck pose, see |PoseRecorder|
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+###############################################################################
+# The stage functions. Each takes the |RunPipeline| of the run and writes its
+# output into 'pipe.path'.
+###############################################################################
+
+def build(pipe):
+    decks, joints = layout(pipe.bridge, pipe.params["l"], pipe.params["leaves"])
+    p = pipe.params
+    masses = [length*p["w"]*p["d"]*p["rho_c"] for length, _ in decks]
+    model = {"definition": pipe.definition, "title": TITLES[pipe.bridge],
+             "decks": [{"length": length, "x": x, "mass": m} for (length, x), m in zip(decks, masses)],
+             "joints": [{"body1": b1, "body2": b2, "x": x, "rate": rate} for b1, b2, x, rate in joints],
+             "total_mass": sum(masses)}
+    _write_json(os.path.join(pipe.path, "build.json"), model)
+
+def simulate(pipe):
+    import bridge_models
+
+    with open(os.path.join(pipe.path, "build.json")) as f:
+        d = json.load(f)["definition"]
+    start = time.perf_counter()
+    model = bridge_models.build_bridge(d["bridge"], d["mode"], d["params"], SolverConfig(**d["solver"]), d["lean"])
+    store = ResultStore.for_model(os.path.join(pipe.path, "reactions"), model)
+    if d["mode"] == "static":
+        rec = bridge_models.solve_static(model)
+        store.append(time=rec.time, force=rec.force, torque=rec.torque)
+    else:
+        p = model.params
+        rec = ReactionRecorder(model.links, p["time_end"], p["time_step"], sink=store)
+        poses = PoseRecorder.for_model(model, POSE_EVERY, sink=store)
+        bridge_models.simulate(model, rec, poses=poses)
+        rec.flush()                                             # Appends the samples still held by the recorders
+        poses.flush()
+    store.meta["wall_time"] = time.perf_counter() - start
+    store.close()
+
+def analyze(pipe):
+    run = StoredRun(os.path.join(pipe.path, "reactions"))
+    _write_json(os.path.join(pipe.path, "analysis.json"), summarize(run, pipe.mode))
+
+def plot(pipe):
+    import matplotlib.pyplot as plt
+
+    if pipe.mode == "static":                                   # A static solve has no time history to plot, see {output}
+        return
+    run = StoredRun(os.path.join(pipe.path, "reactions"))
+    start = int(np.searchsorted(run.time, pipe.analysis().get("transient_end", 0.0)))
+    fig = plot_history(run, "%s - %s" % (TITLES[pipe.bridge], pipe.mode),
+                       os.path.join(pipe.path, "plot.png"), start)
+    plt.close(fig)
+
+_FUNCTIONS = {"build": build, "simulate": simulate, "analyze": analyze, "plot": plot}
+_OUTPUTS = {"build": "build.json", "simulate": os.path.join("reactions", "meta.json"),
+            "analyze": "analysis.json", "plot": "plot.png"}
+_SOURCES = {"build": ("bridge_params.py",),                     # Source files each stage depends on, besides its function
+            "simulate": ("bridge_params.py", "bridge_models.py", "pose_recorder.py", "reaction_recorder.py",
+                         "result_store.py", "solver_config.py"),
+            "analyze": ("convergence.py", "reaction_stats.py", "result_store.py"),
+            "plot": ("bridge_plots.py", "result_store.py")}
+
+def _write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+###############################################################################
+# |RunPipeline| is one run of the pipeline: its definition (as in
+# {cache_key}), its directory '<root>/<title> - <mode> - <key>' and the
+# stamps of its stages. {run} brings every stage up to 'until' up to date and
+# returns the names of the stages it had to run. {output} is the file a stage
+# writes; a stage without one for the run ("plot" of a static run) is up to
+# date as soon as its stamp is.
+###############################################################################
+
+class RunPipeline:
+    def __init__(self, root, bridge, mode, params=None, solver=None, lean=False):
+        solver = solver or SolverConfig()
+        self.bridge = bridge
+        self.mode = mode
+        self.params = make_params(params)
+        self.definition = {"bridge": bridge, "mode": mode, "params": self.params,
+                           "solver": solver.as_dict(), "lean": bool(lean)}
+        key = cache_key(bridge, mode, params, solver, lean)
+        self.path = os.path.join(root, "%s - %s - %s" % (TITLES[bridge], mode, key[:10]))
+
+    def stamps(self):                                           # Stamp every stage's output should have been made with
+        stamps = {}
+        upstream = json.dumps(self.definition, sort_keys=True, default=float)
+        for stage in STAGES:
+            h = hashlib.sha256(upstream.encode())
+            h.update(inspect.getsource(_FUNCTIONS[stage]).encode())
+            for name in _SOURCES[stage]:
+                with open(os.path.join(_HERE, name), "rb") as f:
+                    h.update(f.read())
+            stamps[stage] = upstream = h.hexdigest()
+        return stamps
+
+    def run(self, until="plot", force=()):
+        os.makedirs(self.path, exist_ok=True)
+        stamp_file = os.path.join(self.path, "stamps.json")
+        done = {}
+        if os.path.exists(stamp_file):
+            with open(stamp_file) as f:
+                done = json.load(f)
+
+        ran = []
+        for stage, stamp in self.stamps().items():
+            output = self.output(stage)
+            stale = (ran or stage in force or done.get(stage) != stamp
+                     or (output is not None and not os.path.exists(output)))
+            if stale:
+                _FUNCTIONS[stage](self)
+                done[stage] = stamp
+                _write_json(stamp_file, done)                   # After every stage, so an interrupted run keeps what it finished
+                ran.append(stage)
+            if stage == until:
+                break
+        return ran
+
+    def output(self, stage):                                    # Output file of 'stage', None if it makes none for this run
+        if stage == "plot" and self.mode == "static":
+            return None
+        return os.path.join(self.path, _OUTPUTS[stage])
+
+    def analysis(self):                                         # Content of analysis.json, {} before "analyze" has run
+        path = os.path.join(self.path, "analysis.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+###############################################################################
+# {run_point} runs the pipeline of one point of a sweep and returns the
+# stages it ran and the row of summary.csv. It runs in the worker processes,
+# so it has to stay a module level function.
+###############################################################################
+
+def run_point(root, bridge, mode, params, solver=None, lean=False, until="plot", force=()):
+    pipe = RunPipeline(root, bridge, mode, params, solver, lean)
+    ran = pipe.run(until, force)
+    row = {"bridge": bridge, "mode": mode, "path": pipe.path}
+    row.update(pipe.params)
+    row.update(pipe.analysis())
+    return ran, row
+
+#------------------------------------------------------------------------------
+############################### Command line ##################################
+#------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bring the build, simulate, analyze and plot stages of a "
+                                                 "sweep of bridge runs up to date.")
+    parser.add_argument("bridge", choices=BRIDGE_TYPES)
+    parser.add_argument("--mode", choices=MODES, default="pseudo-static")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="values of one parameter (l, w, d, rho_c, time_step, time_end, omg, leaves), repeatable")
+    parser.add_argument("--solver", type=SolverConfig.parse, default=None, metavar="solver=NAME,max_iters=N,...",
+                        help="solver settings of every run (solver, max_iters, tol, timestepper)")
+    parser.add_argument("--lean", action="store_true",
+                        help="build the models without visual shapes, textures or collision")
+    parser.add_argument("--until", choices=STAGES, default="plot", help="last stage to bring up to date")
+    parser.add_argument("--force", action="append", default=[], choices=STAGES,
+                        help="run this stage (and the ones after it) even if it is up to date, repeatable")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all cores)")
+    parser.add_argument("--root", default="pipeline", help="directory of the runs")
+    args = parser.parse_args(argv)
+
+    points = expand_grid(parse_grid(args.set))
+    n = len(points)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(args.workers or os.cpu_count() or 1, n)) as pool:
+        results = list(pool.map(run_point, [args.root]*n, [args.bridge]*n, [args.mode]*n, points,
+                                [args.solver]*n, [args.lean]*n, [args.until]*n, [tuple(args.force)]*n))
+
+    for stage in STAGES:
+        count = sum(stage in ran for ran, _ in results)
+        print("%-9s ran for %d of %d runs" % (stage, count, n))
+    print("Done in %.1f s" % (time.perf_counter() - start))
+
+    out = os.path.join(args.root, "summary.csv")
+    write_table([row for _, row in results], out)
+    print("Summary written to", out)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
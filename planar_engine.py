@@ -0,0 +1,270 @@
+###############################################################################
+# Planar multibody engine for the bridge family.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# Every bridge model is planar: the joints and motors turn about z and
+# gravity is in the x-y plane, yet {build_bridge} solves each one as a full
+# 3-D Chrono system with six coordinates and a set of constraints per body.
+# This engine solves the same bridges with one coordinate per deck, its angle
+# from horizontal (see bridge_analytic.py), and does it for many
+# configurations at once: the parameters of a batch are arrays along a first
+# axis of configurations and every step is a few NumPy operations over all of
+# them, so a sweep or a Monte Carlo study of thousands of configurations
+# costs about as much as one.
+#
+#   "pseudo-static"  the decks swing freely on their revolute joints; the
+#                    equations of motion of the chain are integrated with
+#                    fourth order Runge-Kutta at 'time_step'
+#   "kinematic"      the angles are the motors' ramps, nothing to integrate
+#   "static"         the decks are held horizontal
+#
+# and the reactions of every mode come from {inverse_dynamics}, with the
+# sign conventions of bridge_analytic.py. The static span is one deck on two
+# pins that never moves, so it only has the reactions of {reactions}.
+#
+# Contact is not modelled: the runs match the lean Chrono models, which have
+# no collision shapes. {validate} compares the two within a tolerance.
+###############################################################################
+
+import sys
+import time
+import argparse
+import numpy as np
+
+from bridge_analytic import _chain, deck_masses, reactions
+from bridge_params import BRIDGE_TYPES, MODES, DEFAULTS, G, make_params
+from inverse_dynamics import EASYBOX_DENSITY, inverse_dynamics, ramp_profile
+
+###############################################################################
+# |PlanarChain| holds the geometry and masses of 'bridge' for parameters
+# 'p' whose "l", "w", "d" and "rho_c" are arrays of shape (configs,). The
+# center of deck i is at
+#
+#   c_i = h + sum over the decks j from the pylon to i of R(phi_j) v_ij
+#
+# with h the joint on the pylon, R(phi_j) the rotation of deck j and v_ij the
+# vector in deck j's frame from the joint carrying j to the next joint on the
+# way to i (or, for j = i, to the center of i). 'arms' holds every v_ij
+# (zero off the way), shape (configs, decks, decks, 2) [m].
+#
+# {accelerations} returns the angular accelerations of the decks [rad/s^2]
+# for angles 'angles' [rad] and angular velocities 'omega' [rad/s] of shape
+# (configs, decks), from the equations of motion in absolute angles
+#
+#   M alpha = Q
+#   M_jk = cos(phi_k - phi_j) A_jk - sin(phi_k - phi_j) B_jk + I_j delta_jk
+#   Q_j  = sum_k (cos(phi_k - phi_j) B_jk + sin(phi_k - phi_j) A_jk) omega_k^2
+#          - g (cos(phi_j) S_j,x - sin(phi_j) S_j,y)
+#
+# with the sums over the decks i, fixed for a configuration,
+#
+#   A_jk = sum m_i v_ij . v_ik,  B_jk = sum m_i v_ij x v_ik,  S_j = sum m_i v_ij
+#
+# so that a step only takes elementwise (configs, decks, decks) operations and
+# one batched solve. For the folding chain with the centers on the joint
+# line (B = 0) this is the usual mass matrix of a pendulum chain,
+# M_jk = L_j L_k cos(phi_j - phi_k) (mass below max(j, k) + half of its own).
+###############################################################################
+
+class PlanarChain:
+    def __init__(self, bridge, p, g=G):
+        lengths, centers, xs, child, parent, _, pinned = _chain(bridge, p["leaves"])
+        if pinned:
+            raise ValueError("The static span does not move and has no equations of motion")
+        l, w, d, rho_c = (np.atleast_1d(np.asarray(p[name], dtype=float)) for name in ("l", "w", "d", "rho_c"))
+        n = len(lengths)
+        self.mass = deck_masses(bridge, l, w, d, rho_c, p["leaves"])        # (configs, decks) [kg]
+        span = l[:, None]*lengths
+        self.inertia = EASYBOX_DENSITY*span*w[:, None]*d[:, None]*(span**2 + d[:, None]**2)/12
+
+        self.arms = np.zeros(np.broadcast_shapes(l.shape, d.shape) + (n, n, 2))
+        carried = {i: k for k, i in enumerate(child)}
+        for i in range(n):
+            k = carried[i]                                      # Joint carrying deck i
+            self.arms[:, i, i, 0] = (centers[i] - xs[k])*l
+            self.arms[:, i, i, 1] = d/2
+            j = parent[k]
+            while j >= 0:                                       # Up the chain to the pylon
+                self.arms[:, i, j, 0] = (xs[k] - xs[carried[j]])*l
+                k = carried[j]
+                j = parent[k]
+
+        v, m = self.arms, self.mass[:, :, None]
+        vx, vy = v[..., 0], v[..., 1]                           # (configs, i, j)
+        self.A = np.einsum("ci,cij,cik->cjk", self.mass, vx, vx) + np.einsum("ci,cij,cik->cjk", self.mass, vy, vy)
+        self.B = np.einsum("ci,cij,cik->cjk", self.mass, vx, vy) - np.einsum("ci,cij,cik->cjk", self.mass, vy, vx)
+        self.Sx = (m*vx).sum(axis=1)
+        self.Sy = (m*vy).sum(axis=1)
+        self.g = g
+        self._diagonal = np.arange(n)
+
+    def accelerations(self, angles, omega):
+        delta = angles[:, None, :] - angles[:, :, None]         # phi_k - phi_j, (configs, j, k)
+        cos, sin = np.cos(delta), np.sin(delta)
+        M = cos*self.A - sin*self.B
+        M[:, self._diagonal, self._diagonal] += self.inertia
+        Q = ((cos*self.B + sin*self.A)*(omega**2)[:, None, :]).sum(axis=-1) \
+            - self.g*(np.cos(angles)*self.Sx - np.sin(angles)*self.Sy)
+        return np.linalg.solve(M, Q[..., None])[..., 0]
+
+###############################################################################
+# |PlanarRun| holds one configuration of a batch like a |ReactionRecorder|
+# holds a Chrono run ('time', 'force' and 'torque' of shape (samples, links,
+# 3), 'names'), so {summarize}, {summarize_batch}, {plot_history} and
+# {write_history} take it, plus the deck 'angles' (samples, decks) [rad].
+###############################################################################
+
+class PlanarRun:
+    def __init__(self, time, force, torque, angles):
+        self.time = time
+        self.force = force
+        self.torque = torque
+        self.angles = angles
+        self.names = ["jm%d" % (k+1) for k in range(force.shape[-2])]
+
+###############################################################################
+# {simulate_batch} runs 'bridge' in 'mode' for every parameter dictionary in
+# 'params_list' (overrides of 'DEFAULTS', as for {build_batch}) and returns
+# one |PlanarRun| per configuration. Like in |BridgeBatch|, 'time_step',
+# 'time_end' and 'leaves' have to be equal across 'params_list'. The samples
+# are taken at every 'every'th step, from t = 0 like a Chrono run records
+# them; "static" gives one sample at t = 0, like {solve_static}.
+###############################################################################
+
+def simulate_batch(bridge, mode="pseudo-static", params_list=(None,), every=1, g=G):
+    if mode not in MODES:
+        raise ValueError("Unknown analysis mode '%s' (expected one of %s)" % (mode, ", ".join(MODES)))
+    all_params = [make_params(params) for params in params_list]
+    for name in ("time_step", "time_end", "leaves"):
+        if len(set(p[name] for p in all_params)) > 1:
+            raise ValueError("Configurations of one batch need the same '%s'" % name)
+    p = {name: np.array([q[name] for q in all_params], dtype=float) for name in ("l", "w", "d", "rho_c", "omg")}
+    p["leaves"] = all_params[0]["leaves"]
+    time_step, time_end = all_params[0]["time_step"], all_params[0]["time_end"]
+    n_steps = int(round(time_end/time_step))
+    pinned = _chain(bridge, p["leaves"])[-1]
+    if mode == "kinematic" and pinned:
+        raise ValueError("The static span has no kinematic mode")
+
+    if mode == "static" or pinned:                              # Nothing moves, the reactions are the static ones
+        steps = np.arange(0, n_steps if mode != "static" else 1, every)
+        force, torque = reactions(bridge, p["l"], p["w"], p["d"], p["rho_c"], 0.0, g, p["leaves"])
+        force, torque = (np.broadcast_to(a[:, None], (len(a), len(steps)) + a.shape[1:]) for a in (force, torque))
+        angles = np.zeros((len(all_params), len(steps), len(_chain(bridge, p["leaves"])[0])))
+    elif mode == "kinematic":
+        steps = np.arange(0, n_steps, every)
+        t = steps*time_step
+        angles, omega, alpha = ramp_profile(bridge, p["omg"][:, None]*t, 1.0, p["leaves"])
+        force, torque = inverse_dynamics(bridge, None, p["l"][:, None], p["w"][:, None], p["d"][:, None],
+                                         p["rho_c"][:, None], leaves=p["leaves"],
+                                         profile=(angles, p["omg"][:, None, None]*omega, alpha), g=g)
+    else:
+        steps, angles, omega, alpha = _integrate(PlanarChain(bridge, p, g), n_steps, time_step, every)
+        force, torque = inverse_dynamics(bridge, None, p["l"][:, None], p["w"][:, None], p["d"][:, None],
+                                         p["rho_c"][:, None], leaves=p["leaves"], profile=(angles, omega, alpha), g=g)
+
+    t = steps*time_step
+    runs = []
+    for c in range(len(all_params)):
+        f = np.zeros(force.shape[1:-1] + (3,))
+        f[..., :2] = force[c]
+        tq = np.zeros(f.shape)
+        tq[..., 2] = torque[c]
+        runs.append(PlanarRun(t, f, tq, angles[c]))
+    return runs
+
+def simulate(bridge, mode="pseudo-static", params=None, every=1, g=G):      # {simulate_batch} of one configuration
+    return simulate_batch(bridge, mode, [params], every, g)[0]
+
+def _integrate(chain, n_steps, time_step, every):              # RK4 from horizontal at rest; angles, velocities, accelerations every 'every' steps
+    configs, n = chain.mass.shape
+    phi = np.zeros((configs, n))
+    omega = np.zeros((configs, n))
+    steps = np.arange(0, n_steps, every)
+    out = np.zeros((3, configs, len(steps), n))
+    h = time_step
+    s = 0
+    for step in range(n_steps):
+        k1 = chain.accelerations(phi, omega)
+        if step == steps[s]:
+            out[0, :, s], out[1, :, s], out[2, :, s] = phi, omega, k1
+            s = min(s + 1, len(steps) - 1)
+        k2 = chain.accelerations(phi + h/2*omega, omega + h/2*k1)
+        k3 = chain.accelerations(phi + h/2*omega + h**2/4*k1, omega + h/2*k2)
+        k4 = chain.accelerations(phi + h*omega + h**2/2*k2, omega + h*k3)
+        phi = phi + h*omega + h**2/6*(k1 + k2 + k3)
+        omega = omega + h/6*(k1 + 2*k2 + 2*k3 + k4)
+    return steps, out[0], out[1], out[2]
+
+###############################################################################
+# {validate} runs 'bridge' in 'mode' with the lean Chrono model and with this
+# engine, and compares the reaction force magnitude and the torque about z of
+# every joint/motor over the Chrono samples after the startup transient.
+# Returns (name, largest Chrono value, largest error, relative error, within
+# 'rtol') rows; the errors are relative to the largest Chrono value of the
+# channel, and a channel whose Chrono value stays below 'atol' (i.e. the
+# torque of a revolute joint) is compared absolutely. Chrono measures the
+# reactions in the link frames, so only magnitudes are compared.
+###############################################################################
+
+def validate(bridge, mode="pseudo-static", params=None, rtol=1e-2, atol=1e-3):
+    import bridge_models
+    from convergence import transient_end
+
+    model = bridge_models.build_bridge(bridge, mode, params, lean=True)
+    rec = bridge_models.solve_static(model) if mode == "static" else bridge_models.simulate(model)
+    start = transient_end(rec.time, rec.force, rec.torque) if mode != "static" else 0
+    run = simulate(bridge, mode, model.params)
+    n = min(len(rec.time), len(run.time))
+
+    rows = []
+    for k, name in enumerate(rec.names):
+        checks = [(name + " force", np.linalg.norm(rec.force[start:n, k], axis=-1),
+                   np.linalg.norm(run.force[start:n, k], axis=-1)),
+                  (name + " torque", np.abs(rec.torque[start:n, k, 2]), np.abs(run.torque[start:n, k, 2]))]
+        for label, chrono_value, value in checks:
+            peak = np.max(chrono_value)
+            error = np.max(np.abs(chrono_value - value))
+            relative = error/peak if peak > atol else error
+            rows.append((label, peak, error, relative, relative <= rtol))
+    return rows
+
+#------------------------------------------------------------------------------
+############################### Command line ##################################
+#------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run bridge configurations with the planar engine.")
+    parser.add_argument("bridge", choices=BRIDGE_TYPES)
+    parser.add_argument("--mode", choices=MODES, default="pseudo-static")
+    parser.add_argument("--configs", type=int, default=1000,
+                        help="number of configurations, with 'rho_c' spread by +-10%% around its default")
+    parser.add_argument("--every", type=int, default=10, help="steps per kept sample of the batch")
+    parser.add_argument("--validate", action="store_true", help="compare with the lean Chrono model first")
+    parser.add_argument("--rtol", type=float, default=1e-2, help="tolerance of --validate, relative to the peaks")
+    args = parser.parse_args(argv)
+
+    if args.validate:
+        ok = True
+        for label, peak, error, relative, within in validate(args.bridge, args.mode, rtol=args.rtol):
+            print("%-12s Chrono peak %14.6g  max. error %12.4g  rel. error %.2e  %s"
+                  % (label, peak, error, relative, "ok" if within else "OUT OF TOLERANCE"))
+            ok = ok and within
+        if not ok:
+            return 1
+
+    rng = np.random.default_rng(0)
+    rho_c = DEFAULTS["rho_c"]*rng.uniform(0.9, 1.1, args.configs)
+    start = time.perf_counter()
+    runs = simulate_batch(args.bridge, args.mode, [{"rho_c": r} for r in rho_c], args.every)
+    wall = time.perf_counter() - start
+    peak = np.array([np.max(np.linalg.norm(run.force, axis=-1)) for run in runs])
+    print("%d configurations of %d samples in %.2f s (%.2f ms each)"
+          % (len(runs), len(runs[0].time), wall, 1e3*wall/len(runs)))
+    print("Peak reaction force %.6g to %.6g N" % (peak.min(), peak.max()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+###############################################################################
+# Recorder for the body poses of the bridge models.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+###############################################################################
+
+import numpy as np
+
+###############################################################################
+# |PoseRecorder| keeps the motion of the bodies of a run (by default the
+# decks, <deck1>, <deck2>, ...) for clearance checks and animations, next to
+# the reactions of |ReactionRecorder|. It preallocates one structured float32
+# array with the fields:
+#
+#   "time"     - simulation time of the sample [s]
+#   "position" - position of the center of each body, shape (bodies, 3) [m]
+#   "rotation" - rotation quaternion (e0, e1, e2, e3) of each body,
+#                shape (bodies, 4) [-]
+#
+# {record} is called every step like |ReactionRecorder|, but only every
+# 'every'th call keeps a sample. float32 and a decimation of 10 bring a
+# 15 s run of the three decks at 'time_step' 2e-3 down to about 66 kB, so
+# thousands of trajectories fit in memory; float32 still resolves a position
+# of 100 m to 10 um.
+#
+# With a 'sink' (a |ResultStore|) the samples are streamed in chunks of
+# 'chunk' to the "pose_time", "position" and "rotation" channels of the
+# store, which can be the same store the reactions go to, and 'time',
+# 'position' and 'rotation' are memory-mapped from it.
+###############################################################################
+
+class PoseRecorder:
+    def __init__(self, bodies, time_end, time_step, names=None, every=1, sink=None, chunk=4096):
+        self.bodies = list(bodies)                              # Chrono bodies to record
+        if names is None:                                       # Names the bodies "deck1", "deck2", ... like the models do
+            names = ["deck%d" % (i+1) for i in range(len(self.bodies))]
+        self.names = list(names)
+        self.every = every                                      # calls of {record} per kept sample
+        self.dtype = np.dtype([("time", np.float32),
+                               ("position", np.float32, (len(self.bodies), 3)),
+                               ("rotation", np.float32, (len(self.bodies), 4))])
+        capacity = int(round(time_end/time_step))//every + 1    # one sample every 'every' steps, plus the initial state
+        self.sink = sink                                        # |ResultStore| the samples are streamed to, if any
+        if sink is not None:
+            capacity = min(capacity, chunk)
+            sink.meta["bodies"] = self.names
+        self.data = np.zeros(max(capacity, 1), self.dtype)
+        self.n = 0                                              # number of samples in 'data'
+        self.flushed = 0                                        # number of samples already appended to 'sink'
+        self._calls = 0
+        self._mapped = {}                                       # (count, memory map) of every field read from 'sink'
+        self._views()
+
+    @classmethod
+    def for_model(cls, model, every=1, sink=None):              # Records the decks of a |BridgeModel|
+        p = model.params
+        names = ["deck%d" % (i+1) for i in range(len(model.decks))]
+        return cls(model.decks, p["time_end"], p["time_step"], names, every, sink)
+
+    def _views(self):                                           # Field views, refreshed whenever 'data' is reallocated
+        self._time = self.data["time"]
+        self._position = self.data["position"]
+        self._rotation = self.data["rotation"]
+
+    def _grow(self):
+        data = np.zeros(2*len(self.data), self.dtype)
+        data[:self.n] = self.data[:self.n]
+        self.data = data
+        self._views()
+
+    def flush(self):                                            # Appends the samples in 'data' to 'sink' and empties it
+        if self.sink is not None and self.n:
+            data = self.data[:self.n]
+            self.sink.append(pose_time=data["time"], position=data["position"], rotation=data["rotation"])
+            self.flushed += self.n
+            self.n = 0
+
+    @property
+    def count(self):                                            # Number of samples recorded in total
+        return self.flushed + self.n
+
+    def record(self, t):
+        self._calls += 1
+        if (self._calls - 1) % self.every:                      # Keeps the first call of every 'every'
+            return
+        i = self.n
+        if i == len(self.data):
+            if self.sink is not None:
+                self.flush()
+                i = 0
+            else:
+                self._grow()
+        self._time[i] = t
+        position = self._position[i]
+        rotation = self._rotation[i]
+        for k, body in enumerate(self.bodies):
+            pos = body.GetPos()
+            rot = body.GetRot()
+            position[k] = (pos.x, pos.y, pos.z)
+            rotation[k] = (rot.e0, rot.e1, rot.e2, rot.e3)
+        self.n = i + 1
+
+    @property
+    def time(self):
+        if self.sink is not None:
+            return self._stored("time", "pose_time")
+        return self._time[:self.n]
+
+    @property
+    def position(self):
+        if self.sink is not None:
+            return self._stored("position")
+        return self._position[:self.n]
+
+    @property
+    def rotation(self):
+        if self.sink is not None:
+            return self._stored("rotation")
+        return self._rotation[:self.n]
+
+    def _stored(self, field, channel=None):                     # Channel of 'sink' with every sample recorded so far
+        count = self.count
+        mapped = self._mapped.get(field)
+        if mapped is not None and mapped[0] == count:           # Nothing recorded since it was mapped
+            return mapped[1]
+        self.flush()
+        if not self.flushed:
+            return self.data[field][:0]
+        stored = self.sink.channel(channel or field)
+        self._mapped[field] = (count, stored)
+        return stored
+
+    @property
+    def angle(self):                                            # Rotation of each body about z, shape (samples, bodies) [rad]
+        return rotation_angle(self.rotation)
+
+def rotation_angle(rotation):                                   # Angle about z of (e0, e1, e2, e3) quaternions rotating about z [rad]
+    rotation = np.asarray(rotation, dtype=np.float64)
+    return 2*np.arctan2(rotation[..., 3], rotation[..., 0])
@@ -0,0 +1,132 @@
+###############################################################################
+# Per-phase timing of the bridge runs.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+###############################################################################
+
+import json
+import time
+import cProfile
+import pstats
+import contextlib
+import numpy as np
+
+_OFF = contextlib.nullcontext()
+
+###############################################################################
+# |PhaseTimer| times the phases of a run ("build", "step", "record",
+# "monitor", "render", "plot", ...) so a slow run can be traced to
+# DoStepDynamics(), the Get_react_force() calls, the Irrlicht window or
+# matplotlib. A phase is timed either with
+#
+#   with timer.phase("build"):
+#       model = build_bridge(...)
+#
+# or with {start} and {stop} around code that should not be re-indented.
+# {simulate} times "step", "record", "monitor" and "render" itself when it is
+# given a timer, and keeps every step time for the histogram of {report}.
+#
+# With 'enabled' False every call returns at once and {simulate} runs its
+# untimed loop, so the timer can stay in the scripts at no cost. With
+# 'cprofile' the whole run between {start_profile} and {stop_profile} is also
+# captured with cProfile; {write} then saves the .prof file next to the JSON
+# breakdown and lists the most expensive functions in it.
+###############################################################################
+
+class PhaseTimer:
+    def __init__(self, enabled=True, cprofile=False, bins=40):
+        self.enabled = enabled
+        self.bins = bins                                        # number of bins of the step time histogram
+        self.totals = {}                                        # total time per phase [s]
+        self.counts = {}                                        # number of times each phase ran
+        self.step_times = []                                    # time of every DoStepDynamics() call [s]
+        self._started = {}
+        self._profiler = cProfile.Profile() if enabled and cprofile else None
+
+    def phase(self, name):
+        if not self.enabled:
+            return _OFF
+        return self._phase(name)
+
+    @contextlib.contextmanager
+    def _phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def start(self, name):
+        if self.enabled:
+            self._started[name] = time.perf_counter()
+
+    def stop(self, name):
+        if self.enabled and name in self._started:
+            self.add(name, time.perf_counter() - self._started.pop(name))
+
+    def add(self, name, seconds):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def add_step(self, seconds):                                # Adds one DoStepDynamics() call to the "step" phase
+        self.step_times.append(seconds)
+        self.add("step", seconds)
+
+    def start_profile(self):
+        if self._profiler is not None:
+            self._profiler.enable()
+
+    def stop_profile(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+
+    def histogram(self):                                        # Counts and bin edges of the step times [s]
+        if not self.step_times:
+            return np.zeros(0, dtype=int), np.zeros(0)
+        return np.histogram(np.asarray(self.step_times), bins=self.bins)
+
+    def report(self):
+        total = sum(self.totals.values())
+        phases = {name: {"total": seconds, "count": self.counts[name],
+                         "mean": seconds/self.counts[name],
+                         "share": seconds/total if total else 0.0}
+                  for name, seconds in sorted(self.totals.items(), key=lambda item: -item[1])}
+        report = {"total": total, "phases": phases}
+        if self.step_times:
+            steps = np.asarray(self.step_times)
+            counts, edges = self.histogram()
+            report["steps"] = {"count": len(steps), "mean": float(steps.mean()),
+                               "p50": float(np.percentile(steps, 50)), "p95": float(np.percentile(steps, 95)),
+                               "p99": float(np.percentile(steps, 99)), "max": float(steps.max()),
+                               "histogram": {"counts": counts.tolist(), "edges": edges.tolist()}}
+        return report
+
+    def summary(self):                                          # Text table of the phases for the console
+        report = self.report()
+        lines = ["%-10s %10s %8s %12s %7s" % ("phase", "total [s]", "count", "mean [s]", "share")]
+        for name, p in report["phases"].items():
+            lines.append("%-10s %10.4f %8d %12.3e %6.1f%%"
+                         % (name, p["total"], p["count"], p["mean"], 100*p["share"]))
+        if "steps" in report:
+            s = report["steps"]
+            lines.append("step time: mean %.3e s, p50 %.3e s, p95 %.3e s, p99 %.3e s, max %.3e s"
+                         % (s["mean"], s["p50"], s["p95"], s["p99"], s["max"]))
+        return "\n".join(lines)
+
+    def write(self, path, top=25):                              # Writes the breakdown as JSON, and the cProfile capture
+        if not self.enabled:
+            return
+        report = self.report()
+        if self._profiler is not None:
+            prof = path.rsplit(".", 1)[0] + ".prof"
+            self._profiler.dump_stats(prof)
+            stats = pstats.Stats(self._profiler).sort_stats("cumulative")
+            rows = []
+            for key in stats.fcn_list[:top]:                    # Most expensive functions, by cumulative time
+                _, calls, total, cumulative, _ = stats.stats[key]
+                rows.append({"function": "%s:%d(%s)" % key, "calls": calls,
+                             "total": total, "cumulative": cumulative})
+            report["cprofile"] = {"file": prof, "top": rows}
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,146 @@
+###############################################################################
+# Recorder for the joint/motor reactions of the bridge models.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+###############################################################################
+
+import numpy as np
+
+###############################################################################
+# |ReactionRecorder| replaces the per-step Python lists ('array_1x',
+# 'array_1y', ...) of the models. It preallocates one structured NumPy array
+# sized from 'time_end'/'time_step' with the fields:
+#
+#   "time"   - simulation time of the sample [s]
+#   "force"  - reaction force of each link, shape (links, 3) [N]
+#   "torque" - reaction torque of each link, shape (links, 3) [Nm]
+#
+# {record} calls Get_react_force() and Get_react_torque() once per link and
+# writes straight into the array. If the run goes past the preallocated size
+# the array is doubled, so extending 'time_end' only costs a few copies.
+#
+# After the run, 'time', 'force' and 'torque' are views of the recorded
+# samples, i.e. 'force'[:,0,1] is the Y reaction force at <jm1>.
+#
+# With a 'sink' (a |ResultStore|) the array only holds 'chunk' samples: each
+# time it is full it is appended to the "time", "force" and "torque" channels
+# of the store and reused, so memory stays flat however long the run is.
+# 'time', 'force' and 'torque' are then memory-mapped from the store, and
+# 'count' is the number of samples recorded in total. The maps are kept and
+# only made again once more samples have been recorded, so reading all three
+# (i.e. a |SteadyStateMonitor| checking the run) appends one chunk at most.
+#
+# The startup transient does not have to be recorded at full resolution
+# (the averages leave it out, see {transient_end}): before 'warmup' seconds
+# only every 'warmup_stride'th call of {record} keeps a sample.
+###############################################################################
+
+class ReactionRecorder:
+    def __init__(self, links, time_end, time_step, names=None, sink=None, chunk=4096, warmup=0.0,
+                 warmup_stride=1):
+        self.links = list(links)                                # Chrono links (joints or motors) to record
+        if names is None:                                       # Names the links "jm1", "jm2", ... like the models do
+            names = ["jm%d" % (i+1) for i in range(len(self.links))]
+        self.names = list(names)
+        self.dtype = np.dtype([("time", np.float64),
+                               ("force", np.float64, (len(self.links), 3)),
+                               ("torque", np.float64, (len(self.links), 3))])
+        capacity = int(round(time_end/time_step)) + 1           # one sample per step, plus the initial state
+        self.sink = sink                                        # |ResultStore| the samples are streamed to, if any
+        if sink is not None:
+            capacity = min(capacity, chunk)
+        self.data = np.zeros(max(capacity, 1), self.dtype)
+        self.n = 0                                              # number of samples in 'data'
+        self.flushed = 0                                        # number of samples already appended to 'sink'
+        self.warmup = warmup                                    # end of the thinned out startup [s]
+        self.warmup_stride = warmup_stride                      # calls of {record} per kept sample before 'warmup'
+        self._calls = 0
+        self._mapped = {}                                       # (count, memory map) of every channel read from 'sink'
+        self._views()
+
+    def _views(self):                                           # Field views, refreshed whenever 'data' is reallocated
+        self._time = self.data["time"]
+        self._force = self.data["force"]
+        self._torque = self.data["torque"]
+
+    def _grow(self):
+        data = np.zeros(2*len(self.data), self.dtype)
+        data[:self.n] = self.data[:self.n]
+        self.data = data
+        self._views()
+
+    def flush(self):                                            # Appends the samples in 'data' to 'sink' and empties it
+        if self.sink is not None and self.n:
+            data = self.data[:self.n]
+            self.sink.append(time=data["time"], force=data["force"], torque=data["torque"])
+            self.flushed += self.n
+            self.n = 0
+
+    @property
+    def count(self):                                            # Number of samples recorded in total
+        return self.flushed + self.n
+
+    def _slot(self, t):                                         # Row the sample at 't' goes to, None if the warmup skips it
+        if t < self.warmup:
+            self._calls += 1
+            if (self._calls - 1) % self.warmup_stride:          # Keeps the first call of every stride
+                return None
+        i = self.n
+        if i == len(self.data):
+            if self.sink is not None:
+                self.flush()
+                i = 0
+            else:
+                self._grow()
+        self._time[i] = t
+        return i
+
+    def record(self, t):
+        i = self._slot(t)
+        if i is None:
+            return
+        force = self._force[i]
+        torque = self._torque[i]
+        for k, link in enumerate(self.links):
+            f = link.Get_react_force()
+            tq = link.Get_react_torque()
+            force[k] = (f.x, f.y, f.z)
+            torque[k] = (tq.x, tq.y, tq.z)
+        self.n = i + 1
+
+    @property
+    def time(self):
+        if self.sink is not None:
+            return self._stored("time")
+        return self._time[:self.n]
+
+    @property
+    def force(self):
+        if self.sink is not None:
+            return self._stored("force")
+        return self._force[:self.n]
+
+    @property
+    def torque(self):
+        if self.sink is not None:
+            return self._stored("torque")
+        return self._torque[:self.n]
+
+    def _stored(self, name):                                    # Channel of 'sink' with every sample recorded so far
+        count = self.count
+        mapped = self._mapped.get(name)
+        if mapped is not None and mapped[0] == count:
+            return mapped[1]
+        self.flush()
+        if not self.flushed:
+            return self.data[name][:0]
+        channel = self.sink.channel(name)
+        self._mapped[name] = (count, channel)
+        return channel
+
+    def average_reaction(self, k, start=0):                     # Magnitude of the mean reaction force at link 'k' from sample 'start' [N]
+        return np.linalg.norm(np.mean(self.force[start:,k], axis=0))
+
+    def mean_torque(self, k, start=0):                          # Mean reaction torque about z at link 'k' from sample 'start' [Nm]
+        return np.mean(self.torque[start:,k,2])
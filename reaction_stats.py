@@ -0,0 +1,177 @@
+###############################################################################
+# Statistics of the reaction histories of the bridge runs.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# The scripts only report the magnitude of the mean reaction force and the
+# mean reaction torque of every joint/motor. Sizing the joints and motors also
+# needs the peaks, RMS values and percentiles, and when the peaks happen.
+# {reaction_stats} computes all of them in one vectorized pass over the
+# recorded arrays, with no loop over the links or the samples:
+#
+#   force   (samples, links, 3)        one run, i.e. 'rec.force'
+#   force   (runs, samples, links, 3)  a stack of runs, see {stack_runs}
+#
+# so a sweep of thousands of runs of the same length is summarized by one
+# call instead of a Python loop over the runs. {summarize} puts them together
+# with the transient of {transient_end} into the summary of a run; it needs
+# no Chrono, so stored runs can be summarized without it.
+###############################################################################
+
+import numpy as np
+
+from convergence import transient_end
+
+PERCENTILES = (5, 50, 95)                                       # percentiles of the resultant reaction [%]
+
+def resultant(force):                                           # Magnitude of the reaction force of every sample [N]
+    return np.linalg.norm(force, axis=-1)
+
+###############################################################################
+# {reaction_stats} returns a dictionary of arrays of shape (links,) for one
+# run, or (runs, links) for a stack of runs:
+#
+#   reaction       magnitude of the mean reaction force [N], as 'average_reaction'
+#   torque         mean reaction torque about z [Nm], as 'mean_torque'
+#   peak_reaction  largest resultant reaction force [N]
+#   peak_time      time of 'peak_reaction' [s]
+#   rms_reaction   RMS of the resultant reaction force [N]
+#   p<q>_reaction  'q'th percentile of the resultant reaction force [N]
+#   peak_torque    largest magnitude of the reaction torque about z [Nm]
+#   rms_torque     RMS of the reaction torque about z [Nm]
+#
+# 'time' is (samples,), or (runs, samples) for a stack of runs (a single
+# (samples,) time is shared by all of them).
+#
+# The samples before 'start' (i.e. the startup transient found by
+# {transient_end}) are left out. 'start' is one index, or one per run of a
+# stack, in which case the samples left out are masked instead: they count
+# as zero in the sums and sort last for the percentiles (see
+# {_masked_percentile}), so a stack with a start per run is still one pass
+# of plain NumPy operations.
+###############################################################################
+
+def reaction_stats(time, force, torque, percentiles=PERCENTILES, start=0):
+    time, force, torque = np.asarray(time), np.asarray(force), np.asarray(torque)
+    if force.ndim not in (3, 4) or force.shape[-1] != 3:
+        raise ValueError("Expected forces of shape (samples, links, 3) or (runs, samples, links, 3), got %s"
+                         % (force.shape,))
+    start = np.asarray(start)
+    n = force.shape[-3]                                         # number of samples before any are left out
+    if not n or not np.all(start < n):
+        raise ValueError("No samples to compute the statistics of")
+    count = (n - start)[..., None]                              # samples kept, (1,) or (runs, 1)
+    if start.ndim == 0:                                         # Same start for every run, a plain slice
+        s = int(start)
+        time, force, torque = time[..., s:], force[..., s:, :, :], torque[..., s:, :, :]
+        f = resultant(force)                                    # (..., samples, links)
+        peak = np.argmax(f, axis=-2)[..., None, :]              # sample of the peak of every link
+        percentile = np.percentile(f, percentiles, axis=-2)
+    else:                                                       # One start per run, masked
+        keep = np.arange(n) >= start[:, None]                   # (runs, samples)
+        force = np.where(keep[..., None, None], force, 0.0)
+        torque = np.where(keep[..., None, None], torque, 0.0)
+        f = resultant(force)
+        peak = np.argmax(np.where(keep[..., None], f, -1.0), axis=-2)[..., None, :]
+        percentile = _masked_percentile(np.where(keep[..., None], f, np.inf), count, percentiles)
+
+    def mean(x, axis):                                          # Mean over the samples kept, the masked ones are zero
+        return np.sum(x, axis=axis)/(count[..., None] if axis == -3 else count)
+
+    tz = torque[..., 2]
+    t = np.broadcast_to(time[..., :, None], f.shape)
+
+    stats = {"reaction": np.linalg.norm(mean(force, axis=-3), axis=-1),
+             "torque": mean(tz, axis=-2),
+             "peak_reaction": np.take_along_axis(f, peak, axis=-2)[..., 0, :],
+             "peak_time": np.take_along_axis(t, peak, axis=-2)[..., 0, :],
+             "rms_reaction": np.sqrt(mean(f**2, axis=-2))}
+    for q, value in zip(percentiles, percentile):
+        stats["p%g_reaction" % q] = value
+    stats["peak_torque"] = np.max(np.abs(tz), axis=-2)
+    stats["rms_torque"] = np.sqrt(mean(tz**2, axis=-2))
+    return stats
+
+###############################################################################
+# {_masked_percentile} returns the percentiles 'q' of 'f' (runs, samples,
+# links) over the samples, with the 'count' (runs, 1) samples kept of every
+# run first and the masked ones set to +inf. One sort puts the kept samples
+# of every run in order in front, and each percentile is interpolated
+# linearly between two of them, like np.percentile does.
+###############################################################################
+
+def _masked_percentile(f, count, q):
+    f = np.sort(f, axis=-2)[None]                               # (1, runs, samples, links)
+    q = np.asarray(q, dtype=float)[:, None, None]/100
+    position = q*(count - 1)                                    # (q, runs, 1), counted in the kept samples
+    low = np.floor(position).astype(int)
+    high = np.minimum(low + 1, count - 1)
+    at_low = np.take_along_axis(f, low[..., None], axis=-2)[..., 0, :]
+    at_high = np.take_along_axis(f, high[..., None], axis=-2)[..., 0, :]
+    return at_low + (at_high - at_low)*(position - low)
+
+###############################################################################
+# {flatten} turns the arrays of {reaction_stats} into '<link>_<statistic>'
+# floats, i.e. "jm1_peak_reaction", like the averages of {summarize}: one
+# dictionary for one run, a list of them for a stack of runs.
+###############################################################################
+
+def flatten(stats, names):
+    first = next(iter(stats.values()))
+    if first.ndim == 2:
+        return [flatten({key: value[i] for key, value in stats.items()}, names) for i in range(len(first))]
+    return {"%s_%s" % (name, key): float(value[k])
+            for k, name in enumerate(names) for key, value in stats.items()}
+
+###############################################################################
+# {stack_runs} stacks the time, forces and torques of several runs (anything
+# with 'time', 'force' and 'torque', i.e. |ReactionRecorder| or |StoredRun|)
+# into (runs, samples, ...) arrays for {reaction_stats}. The runs need the
+# same number of samples and of links.
+###############################################################################
+
+def stack_runs(runs):
+    shapes = {np.shape(run.force) for run in runs}
+    if len(shapes) != 1:
+        raise ValueError("Runs of different lengths or numbers of links cannot be stacked: %s"
+                         % ", ".join(str(s) for s in sorted(shapes)))
+    return (np.stack([run.time for run in runs]), np.stack([run.force for run in runs]),
+            np.stack([run.torque for run in runs]))
+
+###############################################################################
+# {summarize} returns the numbers the scripts print after a run, the
+# magnitude of the average reaction force and the average reaction torque at
+# each joint/motor, keyed "jm1_reaction", "jm1_torque", ..., followed by the
+# peaks, RMS values and percentiles of {reaction_stats}, i.e.
+# "jm1_peak_reaction". All of them leave out the startup transient found by
+# {transient_end}; "transient_end" is the time it ends at [s]. With 'mode'
+# "static" the torques are the holding torques of {solve_static} (see
+# {build_bridge}) and are keyed "jm1_holding_torque", "jm1_peak_holding_torque",
+# ... instead.
+#
+# {summarize_batch} does the same for several recorders of the same length,
+# i.e. the instances of a |BridgeBatch|, in one stacked pass, with the same
+# keys for the same 'mode'.
+###############################################################################
+
+def summarize(recorder, mode=None):
+    time, force, torque = recorder.time, recorder.force, recorder.torque
+    start = transient_end(time, force, torque)
+    summary = _keyed(flatten(reaction_stats(time, force, torque, start=start), recorder.names), mode)
+    summary["transient_end"] = float(time[start])
+    return summary
+
+def summarize_batch(recorders, mode=None):
+    time, force, torque = stack_runs(recorders)
+    start = transient_end(time, force, torque)
+    summaries = flatten(reaction_stats(time, force, torque, start=start), recorders[0].names)
+    summaries = [_keyed(summary, mode) for summary in summaries]
+    for summary, t, i in zip(summaries, time, start):
+        summary["transient_end"] = float(t[i])
+    return summaries
+
+def _keyed(summary, mode):                                      # Renames the torques of a static run to holding torques
+    if mode == "static":
+        return {key.replace("torque", "holding_torque"): value for key, value in summary.items()}
+    return summary
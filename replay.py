@@ -0,0 +1,151 @@
+###############################################################################
+# Off-screen replay of recorded bridge runs.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# Watching a finished run used to mean running the whole simulation again
+# under Irrlicht. This draws it again from the deck poses a |PoseRecorder|
+# streamed to a |ResultStore| (run_bridge.py --poses N --store, the pipeline,
+# or a script with 'pose_every' and 'store_dir' set) without Chrono: frames
+# are drawn side on (the x-y plane the decks rotate in) with matplotlib's Agg
+# canvas, so no display is needed, and split over worker processes that each
+# write their share of the frames as PNG files. With --video the image
+# sequence is then encoded with ffmpeg.
+#
+#   python replay.py "bascule bridge - kinematic.run" --out frames --fps 30 --video bascule.mp4
+#
+# The pylons and the ground are fixed, so they are not recorded; they are
+# drawn from the parameters of the run with {layout}, like {build_bridge}
+# places them.
+###############################################################################
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from bridge_params import TITLES, DECK_HEIGHT, layout
+from pose_recorder import rotation_angle
+from result_store import StoredRun
+
+###############################################################################
+# {frame_samples} returns, for every frame of a replay at 'fps' frames per
+# second of video and 'speed' seconds of run per second of video, the index
+# of the recorded pose closest before it.
+###############################################################################
+
+def frame_samples(pose_time, fps=30, speed=1.0):
+    pose_time = np.asarray(pose_time, dtype=np.float64)
+    times = np.arange(pose_time[0], pose_time[-1] + 1e-9, speed/fps)
+    return np.clip(np.searchsorted(pose_time, times, side="right") - 1, 0, len(pose_time) - 1)
+
+def _load(path):                                                # The |StoredRun| at 'path', checked for recorded poses
+    run = StoredRun(path)
+    if "position" not in run.channels:
+        raise ValueError("%s has no recorded poses (run it with a PoseRecorder streaming to its store)" % path)
+    return run
+
+###############################################################################
+# {render_chunk} draws the frames 'frames' (their numbers in the sequence)
+# from the poses 'samples' of the run at 'path' into 'out_dir'. It runs in
+# the worker processes, so it opens the run itself (memory-mapped) and keeps
+# one figure whose deck lines are moved from frame to frame.
+###############################################################################
+
+def render_chunk(path, out_dir, frames, samples, dpi=100):
+    run = _load(path)
+    p = run.meta["params"]
+    l = p["l"]
+    decks, _ = layout(run.meta["bridge"], l, p.get("leaves", 3))
+    half = np.array([length/2 for length, _ in decks])
+    position = run["position"]
+    angle = rotation_angle(run["rotation"])
+    pose_time = run["pose_time"]
+
+    reach = DECK_HEIGHT + max(length for length, _ in decks)    # A deck raised to vertical
+    fig = Figure(figsize=(8, 4.5), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set(xlim=(-0.65*l, 0.65*l), ylim=(-0.05*reach, 1.05*reach), xlabel='x [m]', ylabel='y [m]')
+    ax.set_aspect("equal")
+    ax.axhspan(-0.05*reach, 0.5, color="tab:blue", alpha=0.3)  # Ground, the top of the box at y = 0.5
+    for x in (-l/2, l/2):                                       # Pylons, 1 x 10 m boxes standing on the ground
+        ax.add_patch(Rectangle((x - 0.5, 0.5), 1, 10, color="0.6"))
+    lines = [ax.plot([], [], lw=3, color="0.4", solid_capstyle="butt")[0] for _ in decks]
+    label = ax.set_title("")
+    title = "%s - %s" % (TITLES[run.meta["bridge"]], run.meta["mode"])
+
+    names = []
+    for frame, i in zip(frames, samples):
+        dx = half*np.cos(angle[i])
+        dy = half*np.sin(angle[i])
+        for k, line in enumerate(lines):
+            x, y = position[i, k, 0], position[i, k, 1]
+            line.set_data([x - dx[k], x + dx[k]], [y - dy[k], y + dy[k]])
+        label.set_text("%s - t = %.2f s" % (title, pose_time[i]))
+        name = os.path.join(out_dir, "frame_%05d.png" % frame)
+        fig.savefig(name)
+        names.append(name)
+    return names
+
+###############################################################################
+# {render} draws every frame of the replay of the run at 'path' into
+# 'out_dir' on 'workers' processes (all cores by default), each drawing a
+# contiguous block of frames, and returns the frame files in order.
+###############################################################################
+
+def render(path, out_dir, fps=30, speed=1.0, workers=None, dpi=100):
+    run = _load(path)
+    samples = frame_samples(run["pose_time"], fps, speed)
+    os.makedirs(out_dir, exist_ok=True)
+    workers = max(min(workers or os.cpu_count() or 1, len(samples)), 1)
+    blocks = np.array_split(np.arange(len(samples)), workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(render_chunk, [path]*workers, [out_dir]*workers, blocks,
+                           [samples[block] for block in blocks], [dpi]*workers)
+        return [name for names in results for name in names]
+
+def encode_video(out_dir, fps, video):                          # Encodes the frames of {render} into 'video' with ffmpeg
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is needed to write a video; the frames are in %s" % out_dir)
+    subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-framerate", str(fps),
+                    "-i", os.path.join(out_dir, "frame_%05d.png"), "-pix_fmt", "yuv420p", video], check=True)
+
+#------------------------------------------------------------------------------
+############################### Command line ##################################
+#------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the recorded deck poses of a bridge run off-screen.")
+    parser.add_argument("run", help="result store of the run, with recorded poses")
+    parser.add_argument("--out", default="frames", help="directory for the frames")
+    parser.add_argument("--fps", type=float, default=30, help="frames per second of the replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="seconds of the run per second of replay")
+    parser.add_argument("--dpi", type=int, default=100, help="resolution of the frames (8 x 4.5 in)")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all cores)")
+    parser.add_argument("--video", default=None, metavar="FILE", help="also encode the frames into FILE with ffmpeg")
+    args = parser.parse_args(argv)
+    if args.video and shutil.which("ffmpeg") is None:
+        parser.error("--video needs ffmpeg on the PATH")
+
+    start = time.perf_counter()
+    frames = render(args.run, args.out, args.fps, args.speed, args.workers, args.dpi)
+    if args.video:
+        encode_video(args.out, args.fps, args.video)
+    wall = time.perf_counter() - start
+    replayed = len(frames)/args.fps*args.speed                  # run time covered by the replay [s]
+    print("%d frames in %.1f s, %.1fx real time" % (len(frames), wall, replayed/wall))
+    print("Frames written to", args.out + (", video to " + args.video if args.video else ""))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+###############################################################################
+# Content-addressed cache of bridge runs.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# Rerunning a configuration that has been run before repeats the whole
+# simulation although nothing changed. The cache below returns the stored
+# reaction histories and summary of such a run instead.
+###############################################################################
+
+import os
+import time
+import json
+import shutil
+import hashlib
+import tempfile
+
+from bridge_params import make_params
+from reaction_recorder import ReactionRecorder
+from result_store import ResultStore, StoredRun
+from solver_config import SolverConfig
+
+STALE_AFTER = 6*3600                                            # age of a temporary run directory left by a crashed run [s]
+
+###############################################################################
+# {cache_key} returns the sha256 of the full definition of a run: the bridge
+# type, mode, every parameter of {make_params} ('l', 'w', 'd', 'rho_c',
+# 'time_step', 'time_end', 'omg', 'leaves'), the |SolverConfig| and the lean
+# build flag. Two definitions that only differ in how they were given
+# (defaults left out, 'l' of 120 or 120.0, an 'omg' of None, a solver of None)
+# get the same key.
+###############################################################################
+
+def cache_key(bridge, mode, params=None, solver=None, lean=False):
+    params = {name: float(value) for name, value in make_params(params).items()}
+    definition = {"bridge": bridge, "mode": mode, "params": params,
+                  "solver": (solver or SolverConfig()).as_dict(), "lean": bool(lean)}
+    text = json.dumps(definition, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+###############################################################################
+# |ResultCache| keys every run by {cache_key} and keeps its reaction
+# histories as a |ResultStore| directory named after the key, with the
+# summary of {summarize} in its metadata:
+#
+#   <root>/chrono_version           version the cached runs were made with
+#   <root>/<key>/meta.json          definition, summary and channels of a run
+#   <root>/<key>/time.npy, ...      the channels, see result_store.py
+#
+# The cache is bounded to 'max_bytes' on disk: every hit marks the run as
+# used (the modification time of its meta.json), and {run} removes the least
+# recently used runs until the cache fits. With 'check_chrono' (the default)
+# the whole cache is cleared when the installed Chrono version differs from
+# the one the runs were made with, since a new solver can give different
+# reactions for the same definition. A sweep checks the version once, in the
+# parent process, and its workers open the cache with 'check_chrono' off.
+#
+# Runs are written to '<key12>.xxxx' temporary directories first (see {run});
+# the ones a crashed run left behind are removed by {evict} and {clear} once
+# nothing has been written to them for 'STALE_AFTER'.
+#
+#   cache = ResultCache()
+#   run = cache.run("drawbridge", "pseudo-static", {"l": 120})
+#   run.meta["summary"]["jm1_torque"], run["torque"][:, 0, 2]
+###############################################################################
+
+class ResultCache:
+    def __init__(self, root=".bridge_cache", max_bytes=2**30, check_chrono=True):
+        self.root = root
+        self.max_bytes = max_bytes                              # largest size of the cache on disk [bytes]
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        if check_chrono:
+            self._check_chrono()
+
+    def _check_chrono(self):                                    # Clears the cache if it was filled by another Chrono version
+        import bridge_models
+
+        path = os.path.join(self.root, "chrono_version")
+        version = bridge_models.chrono_version()
+        stored = None
+        if os.path.exists(path):
+            with open(path) as f:
+                stored = f.read().strip()
+        if stored == version:
+            return
+        if stored is not None:
+            self.clear()
+        fd, tmp = tempfile.mkstemp(prefix="chrono_version.", dir=self.root)
+        with os.fdopen(fd, "w") as f:                           # Written whole and renamed, never seen half written
+            f.write(version)
+        os.replace(tmp, path)
+
+    def get(self, key):                                         # The cached |StoredRun| of 'key', or None
+        path = os.path.join(self.root, key)
+        meta = os.path.join(path, "meta.json")
+        if not os.path.exists(meta):
+            self.misses += 1
+            return None
+        os.utime(meta)                                          # Marks the run as used for the LRU eviction
+        self.hits += 1
+        return StoredRun(path)
+
+    ###########################################################################
+    # {run} returns the cached run of a definition, or simulates it (or solves
+    # it statically in "static" mode), stores it and returns it. The run is
+    # written under a temporary name and renamed into place, so a run that is
+    # interrupted, or two processes of a sweep running the same definition,
+    # never leave a half written entry.
+    ###########################################################################
+
+    def run(self, bridge, mode, params=None, solver=None, lean=False):
+        key = cache_key(bridge, mode, params, solver, lean)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        import bridge_models
+
+        start = time.perf_counter()
+        model = bridge_models.build_bridge(bridge, mode, params, solver, lean)
+        tmp = tempfile.mkdtemp(prefix=key[:12] + ".", dir=self.root)
+        store = ResultStore.for_model(tmp, model)
+        if mode == "static":
+            rec = bridge_models.solve_static(model)
+            store.append(time=rec.time, force=rec.force, torque=rec.torque)
+        else:
+            p = model.params
+            rec = ReactionRecorder(model.links, p["time_end"], p["time_step"], sink=store)
+            bridge_models.simulate(model, rec)
+        store.meta["summary"] = bridge_models.summarize(rec, mode)
+        store.meta["key"] = key
+        store.meta["wall_time"] = time.perf_counter() - start
+        store.close()
+
+        path = os.path.join(self.root, key)
+        try:
+            os.rename(tmp, path)
+        except OSError:                                         # Another process stored the same run first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=key)
+        return StoredRun(path)
+
+    def entries(self):                                          # (last used, size [bytes], key) of every cached run
+        entries = []
+        for key in os.listdir(self.root):
+            meta = os.path.join(self.root, key, "meta.json")
+            if len(key) != 64 or not os.path.exists(meta):
+                continue
+            folder = os.path.join(self.root, key)
+            size = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+            entries.append((os.path.getmtime(meta), size, key))
+        return entries
+
+    def size(self):                                             # Size of the cache on disk [bytes]
+        return sum(size for _, size, _ in self.entries())
+
+    def stale(self):                                            # Temporary directories of runs that crashed, see 'STALE_AFTER'
+        stale = []
+        now = time.time()
+        for name in os.listdir(self.root):
+            folder = os.path.join(self.root, name)
+            prefix, dot, _ = name.partition(".")
+            if not dot or len(prefix) != 12 or not os.path.isdir(folder):
+                continue
+            try:
+                changed = max([os.path.getmtime(folder)] +
+                              [os.path.getmtime(os.path.join(folder, f)) for f in os.listdir(folder)])
+            except OSError:                                     # Renamed into place or removed meanwhile
+                continue
+            if now - changed > STALE_AFTER:
+                stale.append(folder)
+        return stale
+
+    def _remove_stale(self):
+        for folder in self.stale():
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def evict(self, keep=None):                                 # Removes the least recently used runs, but 'keep', until the cache fits
+        self._remove_stale()
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        self._remove_stale()
+        for _, _, key in self.entries():
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
@@ -0,0 +1,170 @@
+###############################################################################
+# On-disk store of the time histories of the bridge runs.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# A run is stored as a directory with one file per channel and the metadata
+# of the run:
+#
+#   meta.json   - bridge type, mode, parameters, solver settings, channels
+#   time.npy    - time of every sample, shape (n,) [s]
+#   force.npy   - reaction forces, shape (n, links, 3) [N]
+#   torque.npy  - reaction torques, shape (n, links, 3) [Nm]
+#
+# The channels are standard .npy files, so any of them can be opened with
+# np.load(path, mmap_mode="r") on its own without reading the others. They
+# are written in chunks while the run goes: every chunk is appended to the
+# end of the file, the shape in the header is rewritten and the file is
+# flushed, so memory stays flat however long the run is and the files of an
+# interrupted run hold everything up to its last chunk (meta.json is only
+# written by {close}, so they have to be opened with np.load then). With
+# 'compress' the channels are packed into one compressed channels.npz when
+# the store is closed; a single channel can still be read from it without
+# the others, but no longer memory-mapped.
+###############################################################################
+
+import os
+import json
+import numpy as np
+
+_HEADER = 128                                                   # bytes reserved for every .npy header, room for any shape
+
+###############################################################################
+# |ResultStore| writes the channels of one run into the directory 'path'.
+# {append} adds a chunk to any number of channels at once; a channel is
+# created with the dtype and sample shape of its first chunk. {close}
+# finishes the files and writes meta.json; it is also called when the store
+# is used in a with block. {for_model} fills the metadata from a
+# |BridgeModel|.
+###############################################################################
+
+class ResultStore:
+    def __init__(self, path, meta=None, compress=False):
+        self.path = path
+        self.meta = dict(meta or {})
+        self.compress = compress
+        self.closed = False
+        self._files = {}                                        # open file of each channel
+        self._shapes = {}                                       # (dtype, sample shape, samples written) of each channel
+        os.makedirs(path, exist_ok=True)
+
+    @classmethod
+    def for_model(cls, path, model, compress=False):
+        meta = {"bridge": model.bridge, "mode": model.mode, "params": model.params,
+                "lean": model.lean, "links": len(model.links)}
+        if model.solver is not None:
+            meta["solver"] = model.solver.as_dict()
+        return cls(path, meta, compress)
+
+    def append(self, **chunks):
+        for name, chunk in chunks.items():
+            chunk = np.ascontiguousarray(chunk)
+            if name not in self._files:
+                f = open(os.path.join(self.path, name + ".npy"), "w+b")
+                f.write(_npy_header(chunk.dtype, (0,) + chunk.shape[1:]))
+                self._files[name] = f
+                self._shapes[name] = (chunk.dtype, chunk.shape[1:], 0)
+            dtype, sample, n = self._shapes[name]
+            if chunk.shape[1:] != sample:
+                raise ValueError("Chunk of shape %s does not fit channel '%s' of samples %s"
+                                 % (chunk.shape, name, sample))
+            f = self._files[name]
+            f.write(chunk.astype(dtype, copy=False).tobytes())
+            n += len(chunk)
+            self._shapes[name] = (dtype, sample, n)
+            f.seek(0)                                           # The header always has the shape of what is in the file
+            f.write(_npy_header(dtype, (n,) + sample))
+            f.seek(0, os.SEEK_END)
+            f.flush()
+
+    def flush(self):                                            # Makes everything appended so far readable from the files
+        for f in self._files.values():
+            f.flush()
+
+    def channel(self, name):                                    # Memory-mapped view of a channel with everything appended so far
+        if self.closed:
+            return StoredRun(self.path).channel(name)
+        self.flush()
+        return np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r")
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        channels = {name: {"dtype": dtype.str, "shape": [n] + list(sample)}
+                    for name, (dtype, sample, n) in self._shapes.items()}
+        if self.compress and channels:
+            files = [os.path.join(self.path, name + ".npy") for name in channels]
+            np.savez_compressed(os.path.join(self.path, "channels.npz"),
+                                **{name: np.load(f, mmap_mode="r") for name, f in zip(channels, files)})
+            for f in files:
+                os.remove(f)
+        meta = dict(self.meta, channels=channels, compressed=bool(self.compress and channels))
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _npy_header(dtype, shape):                                  # .npy version 1.0 header padded to '_HEADER' bytes
+    text = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (np.lib.format.dtype_to_descr(dtype), shape)
+    size = _HEADER - 10                                         # magic string, version and header length take 10 bytes
+    if len(text) >= size:
+        raise ValueError("Channel of dtype %s and shape %s does not fit a .npy header" % (dtype, shape))
+    text = text.ljust(size - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + size.to_bytes(2, "little") + text.encode("latin1")
+
+###############################################################################
+# |StoredRun| reads a run written by |ResultStore|: 'meta' is the content of
+# meta.json and {channel} returns one channel, memory-mapped unless the store
+# was compressed. 'run["force"]' is short for 'run.channel("force")'. The
+# reaction channels are also 'time', 'force' and 'torque', with the links
+# named in 'names', like on a |ReactionRecorder|, so a stored run can be
+# plotted and written the same way as a live one.
+###############################################################################
+
+class StoredRun:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self._npz = None
+
+    @property
+    def channels(self):
+        return list(self.meta["channels"])
+
+    def channel(self, name, mmap=True):
+        if name not in self.meta["channels"]:
+            raise KeyError("No channel '%s' in %s (has %s)" % (name, self.path, ", ".join(self.channels)))
+        if self.meta.get("compressed"):
+            if self._npz is None:
+                self._npz = np.load(os.path.join(self.path, "channels.npz"))
+            return self._npz[name]
+        return np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r" if mmap else None)
+
+    def __getitem__(self, name):
+        return self.channel(name)
+
+    @property
+    def names(self):
+        return ["jm%d" % (i+1) for i in range(self.meta.get("links", 0))]
+
+    @property
+    def time(self):
+        return self.channel("time")
+
+    @property
+    def force(self):
+        return self.channel("force")
+
+    @property
+    def torque(self):
+        return self.channel("torque")
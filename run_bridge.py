@@ -0,0 +1,248 @@
+###############################################################################
+# Command line runner of the bridge models.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# Runs one bridge model without editing a script: the bridge type, the
+# analysis mode ('mj' in the scripts) and any parameter overrides are given as
+# arguments, {build_bridge} creates the matching revolute joints or motors,
+# and the results are written under a name made from those arguments, i.e.
+#
+#   python run_bridge.py bascule --mode kinematic --set l=100 --set d=0.4 --headless
+#
+# writes
+#
+#   bascule bridge - kinematic - d=0.4 l=100.0.csv   time history of the reactions
+#   bascule bridge - kinematic - d=0.4 l=100.0.json  averages, parameters, settings
+#   bascule bridge - kinematic - d=0.4 l=100.0.png   plot of the time history
+#   bascule bridge - kinematic - d=0.4 l=100.0.run/  with --store, the channels
+#                                                    streamed while running, see
+#                                                    |ResultStore|
+#   bascule bridge - kinematic - d=0.4 l=100.0.poses.npz
+#                                                    with --poses N, the deck
+#                                                    poses every N steps, see
+#                                                    |PoseRecorder| (streamed to
+#                                                    the .run/ store instead
+#                                                    with --store)
+#
+# into --out-dir. Overrides are sorted by name in the file name, so the same
+# run always gets the same name whatever order the arguments came in, and are
+# written with every digit (repr), so runs that differ only past the 6th
+# significant digit do not overwrite each other's files.
+#
+# With --inverse a kinematic run is not simulated: the reactions and motor
+# torques at every time step are computed from the prescribed ramps by
+# {run_inverse} (inverse_dynamics.py), and the files are named
+# "... - kinematic inverse - ...".
+#
+# With --cache DIR the run is taken from the |ResultCache| in DIR when the
+# same definition has been run before, and run and stored there otherwise.
+# A cached run is a full run with nothing else recorded, so --cache cannot be
+# combined with --steady-rtol, --store, --poses, --warmup or --profile.
+###############################################################################
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+import bridge_models
+import inverse_dynamics
+from bridge_plots import plot_history
+from convergence import SteadyStateMonitor
+from pose_recorder import PoseRecorder
+from profiling import PhaseTimer
+from reaction_recorder import ReactionRecorder
+from result_cache import ResultCache
+from result_store import ResultStore
+from solver_config import SolverConfig
+
+###############################################################################
+# {run_name} returns the base name of the output files of a run, see above.
+###############################################################################
+
+def run_name(bridge, mode, overrides=None):
+    name = "%s - %s" % (bridge_models.TITLES[bridge], mode)
+    if overrides:
+        name += " - " + " ".join("%s=%r" % (k, float(overrides[k])) for k in sorted(overrides))
+    return name
+
+def parse_overrides(items):                                     # Turns ["l=100", "d=.4"] into {"l": 100.0, "d": 0.4}
+    overrides = {}
+    for item in items:
+        name, _, value = item.partition("=")
+        if not value:
+            raise ValueError("Expected NAME=VALUE, got '%s'" % item)
+        overrides[name.strip()] = float(value)
+    bridge_models.make_params(overrides)                        # Rejects unknown names before anything is built
+    return overrides
+
+###############################################################################
+# {write_history} writes the time history of 'rec' as CSV: the time, then the
+# X, Y and Z reaction force and torque of every joint/motor.
+###############################################################################
+
+def write_history(rec, path):
+    columns = [rec.time[:, None]]
+    header = ["time"]
+    for k, name in enumerate(rec.names):
+        columns += [rec.force[:, k], rec.torque[:, k]]
+        header += [name + "_f" + axis for axis in "xyz"] + [name + "_t" + axis for axis in "xyz"]
+    np.savetxt(path, np.hstack(columns), delimiter=",", fmt="%.10g", header=",".join(header), comments="")
+
+###############################################################################
+# {run_model} builds and runs the model the arguments describe, opening the
+# Irrlicht window unless --headless or --lean is given, and returns the
+# recorder, the parameters, the |SteadyStateMonitor| (None without
+# --steady-rtol), the |ResultStore| (None without --store) and the
+# |PoseRecorder| (None without --poses).
+###############################################################################
+
+def run_model(args, overrides, solver, base, timer):
+    with timer.phase("build"):
+        model = bridge_models.build_bridge(args.bridge, args.mode, overrides, solver, args.lean)
+    p = model.params
+    store = ResultStore.for_model(base + ".run", model, args.compress) if args.store else None
+    monitor = None
+    poses = None
+
+    if args.mode == "static":
+        with timer.phase("solve"):
+            rec = bridge_models.solve_static(model)
+        if store is not None:
+            store.append(time=rec.time, force=rec.force, torque=rec.torque)
+        return rec, p, monitor, store, poses
+
+    scheduler = None
+    if not args.headless and not args.lean:                     # A lean model has nothing to draw
+        from bridge_vis import open_window, RenderScheduler
+        with timer.phase("window"):
+            vis = open_window(model.system, model.title)
+        scheduler = RenderScheduler(vis, fps=args.render_fps)
+    if args.steady_rtol:
+        monitor = SteadyStateMonitor(rtol=args.steady_rtol)
+    rec = ReactionRecorder(model.links, p["time_end"], p["time_step"], sink=store, warmup=args.warmup,
+                           warmup_stride=args.warmup_stride)
+    if args.poses:
+        poses = PoseRecorder.for_model(model, args.poses, sink=store)
+    bridge_models.simulate(model, rec, scheduler, monitor, timer, poses)
+    return rec, p, monitor, store, poses
+
+#------------------------------------------------------------------------------
+############################### Command line ##################################
+#------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run one bridge model and write its reactions.")
+    parser.add_argument("bridge", choices=bridge_models.BRIDGE_TYPES)
+    parser.add_argument("--mode", choices=bridge_models.MODES, default="pseudo-static",
+                        help="revolute joints (pseudo-static), ramped motors (kinematic) or a static solve")
+    parser.add_argument("--inverse", action="store_true",
+                        help="with --mode kinematic, compute the reactions by inverse dynamics instead of simulating")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="parameter override (l, w, d, rho_c, time_step, time_end, omg), repeatable")
+    parser.add_argument("--solver", type=SolverConfig.parse, default=None, metavar="solver=NAME,max_iters=N,...",
+                        help="solver settings (solver, max_iters, tol, timestepper)")
+    parser.add_argument("--steady-rtol", type=float, default=None,
+                        help="stop once the reactions settle within this relative tolerance")
+    parser.add_argument("--warmup", type=float, default=0.0, metavar="SECONDS",
+                        help="record the first SECONDS of the run (the startup transient) thinned out")
+    parser.add_argument("--warmup-stride", type=int, default=10,
+                        help="steps per recorded sample during --warmup")
+    parser.add_argument("--poses", type=int, default=None, metavar="EVERY",
+                        help="also record the deck poses every EVERY steps")
+    parser.add_argument("--profile", choices=("phases", "cprofile"), default=None,
+                        help="write a timing breakdown of the run")
+    parser.add_argument("--headless", action="store_true", help="no Irrlicht window and no plot window")
+    parser.add_argument("--lean", action="store_true",
+                        help="build without visual shapes, textures or collision (no Irrlicht window)")
+    parser.add_argument("--render-fps", type=float, default=30, help="frame rate of the Irrlicht window")
+    parser.add_argument("--store", action="store_true",
+                        help="stream the reactions to a result store while running")
+    parser.add_argument("--compress", action="store_true", help="compress the result store when the run ends")
+    parser.add_argument("--cache", default=None, metavar="DIR",
+                        help="take the run from this result cache if it was run before, headless")
+    parser.add_argument("--out-dir", default=".", help="directory for the output files")
+    args = parser.parse_args(argv)
+
+    try:
+        overrides = parse_overrides(args.set)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.inverse and (args.mode != "kinematic" or args.cache or args.store or args.poses):
+        parser.error("--inverse needs --mode kinematic and works without --cache, --store and --poses")
+    if args.cache:                                              # A cached run is a plain full run; these would not be applied
+        given = [flag for flag, value in (("--steady-rtol", args.steady_rtol), ("--store", args.store),
+                                          ("--compress", args.compress), ("--poses", args.poses),
+                                          ("--warmup", args.warmup), ("--profile", args.profile)) if value]
+        if given:
+            parser.error("--cache cannot be combined with %s" % ", ".join(given))
+    mode = args.mode + " inverse" if args.inverse else args.mode
+    base = os.path.join(args.out_dir, run_name(args.bridge, mode, overrides))
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    timer = PhaseTimer(enabled=bool(args.profile), cprofile=(args.profile == "cprofile"))
+    timer.start_profile()
+    title = bridge_models.TITLES[args.bridge]
+    solver = args.solver or SolverConfig()
+    store = None
+    monitor = None
+    poses = None
+
+    if args.cache:
+        cache = ResultCache(args.cache)
+        with timer.phase("cache"):
+            rec = cache.run(args.bridge, args.mode, overrides, solver, args.lean)
+        print("Taken from the cache" if cache.hits else "Run and stored in the cache", "(%s)" % rec.path)
+        p = rec.meta["params"]
+        summary = rec.meta["summary"]
+    elif args.inverse:
+        with timer.phase("solve"):
+            rec = inverse_dynamics.run_inverse(args.bridge, overrides)
+        p = bridge_models.make_params(overrides)
+        summary = bridge_models.summarize(rec)
+    else:
+        rec, p, monitor, store, poses = run_model(args, overrides, solver, base, timer)
+        summary = bridge_models.summarize(rec, args.mode)
+
+    for name, value in summary.items():
+        print("%-24s %.6g" % (name, value))
+    if monitor is not None:
+        print(monitor.report(p["time_end"]))
+
+    result = {"bridge": args.bridge, "mode": args.mode, "inverse": args.inverse, "lean": args.lean, "params": p,
+              "solver": solver.as_dict(), "summary": summary}
+    if monitor is not None:
+        result["settled_at"] = monitor.settled_at
+    with open(base + ".json", "w") as f:
+        json.dump(result, f, indent=2)
+    write_history(rec, base + ".csv")
+
+    if args.mode != "static":                                   # A static solve has no time history to plot
+        with timer.phase("plot"):
+            start = int(np.searchsorted(rec.time, summary.get("transient_end", 0.0)))
+            plot_history(rec, title + " - " + mode, base + ".png", start)
+
+    if poses is not None and store is None:
+        np.savez(base + ".poses.npz", time=poses.time, position=poses.position, rotation=poses.rotation,
+                 names=np.array(poses.names))
+    if store is not None:
+        if poses is not None:
+            poses.flush()
+        store.close()
+
+    timer.stop_profile()
+    if args.profile:
+        print(timer.summary())
+        timer.write(base + " - profile.json")
+    print("Results written to", base + ".*")
+
+    if not args.headless and args.mode != "static":
+        import matplotlib.pyplot as plt
+        plt.show()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
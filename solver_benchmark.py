@@ -0,0 +1,163 @@
+###############################################################################
+# Solver and timestepper comparison for the bridge models.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# The bridge models are almost nothing but links, so the default solver
+# settings of ChSystemNSC() are not necessarily the cheapest ones that still
+# give the right reactions. This runs every bridge type in every dynamic mode
+# under every combination of the given solvers, timesteppers, iteration
+# limits and tolerances (see |SolverConfig|) for 'duration' seconds of
+# simulated time, headless, and reports for each:
+#
+#   steps_per_s   - physics steps per second of wall-clock time
+#   drift         - largest separation of any hinge seen during the run [m],
+#                   see {constraint_drift}
+#   force_error   - largest difference of any reaction force from the
+#                   reference run, relative to the largest reference force
+#   torque_error  - the same for the reaction torques
+#
+# The reference run uses 'REFERENCE' (or --reference), a tightly converged
+# iterative solver, at the same time step as the other runs.
+#
+# Example, PSOR against APGD at two iteration limits:
+#
+#   python solver_benchmark.py --solvers psor,apgd --max-iters 25,100
+#       --duration 2 --out solver_benchmark.csv
+###############################################################################
+
+import time
+import argparse
+import itertools
+import numpy as np
+
+import bridge_models
+from bridge_sweep import write_table
+from reaction_recorder import ReactionRecorder
+from solver_config import SolverConfig
+
+REFERENCE = SolverConfig("barzilaiborwein", max_iters=1000, tol=1e-10)
+
+###############################################################################
+# {solver_grid} returns a |SolverConfig| for every combination of the given
+# solvers, timesteppers, iteration limits and tolerances. None in any list
+# stands for the Chrono default.
+###############################################################################
+
+def solver_grid(solvers=(None,), timesteppers=(None,), max_iters=(None,), tols=(None,)):
+    return [SolverConfig(s, n, tol, ts)
+            for s, ts, n, tol in itertools.product(solvers, timesteppers, max_iters, tols)]
+
+###############################################################################
+# {run_case} builds 'bridge' in 'mode' with 'solver', steps it for 'duration'
+# seconds and returns the |ReactionRecorder| of the run, the number of
+# steps per second and the largest constraint drift [m]. The drift is only
+# measured every 'drift_every' steps to keep it out of the timing.
+###############################################################################
+
+def run_case(bridge, mode, params, solver, duration, drift_every=50):
+    model = bridge_models.build_bridge(bridge, mode, params, solver)
+    system = model.system
+    time_step = model.params["time_step"]
+    rec = ReactionRecorder(model.links, duration, time_step)
+
+    drift = 0.0
+    steps = 0
+    start = time.perf_counter()
+    while system.GetChTime() < duration:
+        rec.record(system.GetChTime())
+        system.DoStepDynamics(time_step)
+        steps += 1
+        if steps % drift_every == 0:
+            drift = max(drift, bridge_models.constraint_drift(model))
+    elapsed = time.perf_counter() - start
+    drift = max(drift, bridge_models.constraint_drift(model))
+
+    return rec, steps/max(elapsed, 1e-12), drift
+
+###############################################################################
+# {reaction_error} returns the largest difference between the reactions of
+# 'rec' and 'ref', relative to the largest reference value, for the forces and
+# for the torques. 'rec' is interpolated onto the times of 'ref', so runs with
+# a different time step can be compared too.
+###############################################################################
+
+def reaction_error(rec, ref):
+    errors = []
+    for values, ref_values in ((rec.force, ref.force), (rec.torque, ref.torque)):
+        flat = values.reshape(len(rec.time), -1)
+        ref_flat = ref_values.reshape(len(ref.time), -1)
+        on_ref = np.column_stack([np.interp(ref.time, rec.time, flat[:, k]) for k in range(flat.shape[1])])
+        scale = max(np.max(np.abs(ref_flat)), 1e-12)
+        errors.append(float(np.max(np.abs(on_ref - ref_flat))/scale))
+    return errors
+
+###############################################################################
+# {benchmark} runs every bridge type in 'bridges' and mode in 'modes' once
+# with 'reference' and once with every config of 'configs', and returns one
+# row per run. Modes a bridge type does not have (the kinematic static span)
+# and the "static" mode, which does not step, are skipped.
+###############################################################################
+
+def benchmark(configs, bridges=bridge_models.BRIDGE_TYPES, modes=("pseudo-static", "kinematic"),
+              params=None, duration=2.0, reference=REFERENCE, drift_every=50):
+    rows = []
+    for bridge in bridges:
+        for mode in modes:
+            if mode == "static" or (mode == "kinematic" and bridge == "static"):
+                continue
+            ref, ref_rate, ref_drift = run_case(bridge, mode, params, reference, duration, drift_every)
+            rows.append(_row(bridge, mode, "reference: " + reference.label, ref_rate, ref_drift, (0.0, 0.0)))
+            for config in configs:
+                rec, rate, drift = run_case(bridge, mode, params, config, duration, drift_every)
+                rows.append(_row(bridge, mode, config.label, rate, drift, reaction_error(rec, ref)))
+    return rows
+
+def _row(bridge, mode, label, rate, drift, errors):
+    return {"bridge": bridge, "mode": mode, "solver": label, "steps_per_s": rate,
+            "drift": drift, "force_error": errors[0], "torque_error": errors[1]}
+
+def _names(text):                                               # Turns "psor,default" into ["psor", None]
+    return [None if name in ("", "default") else name for name in text.split(",")]
+
+#------------------------------------------------------------------------------
+############################### Command line ##################################
+#------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare solver and timestepper settings on the bridge models.")
+    parser.add_argument("--bridges", default=",".join(bridge_models.BRIDGE_TYPES),
+                        help="comma separated bridge types (default: all)")
+    parser.add_argument("--modes", default="pseudo-static,kinematic", help="comma separated analysis modes")
+    parser.add_argument("--solvers", default="default,psor,barzilaiborwein,apgd",
+                        help="comma separated solver types, 'default' for Chrono's")
+    parser.add_argument("--timesteppers", default="default", help="comma separated timestepper types")
+    parser.add_argument("--max-iters", default="default", help="comma separated iteration limits")
+    parser.add_argument("--tols", default="default", help="comma separated solver tolerances")
+    parser.add_argument("--reference", type=SolverConfig.parse, default=REFERENCE,
+                        metavar="solver=NAME,max_iters=N,...", help="settings of the reference run")
+    parser.add_argument("--duration", type=float, default=2.0, help="simulated time of every run [s]")
+    parser.add_argument("--time-step", type=float, default=None, help="time step of every run [s]")
+    parser.add_argument("--out", default="solver_benchmark.csv", help="CSV file for the results table")
+    args = parser.parse_args(argv)
+
+    iters = [None if n is None else int(n) for n in _names(args.max_iters)]
+    tols = [None if tol is None else float(tol) for tol in _names(args.tols)]
+    configs = solver_grid(_names(args.solvers), _names(args.timesteppers), iters, tols)
+    params = {"time_step": args.time_step} if args.time_step else None
+
+    rows = benchmark(configs, args.bridges.split(","), args.modes.split(","), params,
+                     args.duration, args.reference)
+
+    print("%-10s %-14s %-48s %12s %10s %11s %12s"
+          % ("bridge", "mode", "solver", "steps/s", "drift [m]", "force err", "torque err"))
+    for row in rows:
+        print("%-10s %-14s %-48s %12.0f %10.2e %11.2e %12.2e"
+              % (row["bridge"], row["mode"], row["solver"], row["steps_per_s"],
+                 row["drift"], row["force_error"], row["torque_error"]))
+    write_table(rows, args.out)
+    print("Results written to", args.out)
+
+if __name__ == "__main__":
+    main()
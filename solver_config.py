@@ -0,0 +1,76 @@
+###############################################################################
+# Solver and timestepper settings for the bridge models.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+###############################################################################
+
+###############################################################################
+# |SolverConfig| holds the solver type, maximum number of solver iterations,
+# solver tolerance and timestepper of a model. Anything left at None keeps
+# the default that chrono.ChSystemNSC() comes with, so SolverConfig() is the
+# setup the models have always used.
+#
+# The solver and timestepper are given by name, i.e. "psor", "apgd",
+# "barzilaiborwein", "minres" for the solver ('chrono.ChSolver.Type_*') and
+# "euler_implicit_linearized", "euler_implicit_projected" for the timestepper
+# ('chrono.ChTimestepper.Type_*'). Names are checked when {apply} is called,
+# which is also the only place Chrono is imported, so configs can be parsed,
+# compared and stored on a machine without it.
+#
+# {parse} builds a config from a string like "solver=apgd,max_iters=100",
+# which is how the command line tools take it, and 'label' turns it back into
+# one for tables and file names.
+###############################################################################
+
+class SolverConfig:
+    def __init__(self, solver=None, max_iters=None, tol=None, timestepper=None):
+        self.solver = solver                                    # solver type name, Chrono default if None
+        self.max_iters = max_iters                              # maximum number of solver iterations
+        self.tol = tol                                          # solver tolerance
+        self.timestepper = timestepper                          # timestepper type name, Chrono default if None
+
+    def apply(self, system):
+        import pychrono as chrono
+
+        if self.solver is not None:
+            system.SetSolverType(_enum(chrono.ChSolver, self.solver, "solver"))
+        if self.max_iters is not None:
+            system.SetSolverMaxIterations(int(self.max_iters))
+        if self.tol is not None:
+            system.SetSolverTolerance(float(self.tol))
+        if self.timestepper is not None:
+            system.SetTimestepperType(_enum(chrono.ChTimestepper, self.timestepper, "timestepper"))
+
+    def as_dict(self):
+        return {"solver": self.solver, "max_iters": self.max_iters,
+                "tol": self.tol, "timestepper": self.timestepper}
+
+    @property
+    def label(self):
+        parts = ["%s=%s" % (name, value) for name, value in self.as_dict().items() if value is not None]
+        return ",".join(parts) or "default"
+
+    @classmethod
+    def parse(cls, text):
+        config = cls()
+        if not text or text == "default":
+            return config
+        for item in text.split(","):
+            name, _, value = item.partition("=")
+            name = name.strip()
+            if name not in ("solver", "max_iters", "tol", "timestepper") or not value:
+                raise ValueError("Expected solver=, max_iters=, tol= or timestepper=, got '%s'" % item)
+            if name == "max_iters":
+                value = int(value)
+            elif name == "tol":
+                value = float(value)
+            setattr(config, name, value)
+        return config
+
+def _enum(owner, name, kind):                                   # Looks up 'Type_<NAME>' on ChSolver or ChTimestepper
+    try:
+        return getattr(owner, "Type_" + name.upper())
+    except AttributeError:
+        names = sorted(n[5:].lower() for n in dir(owner) if n.startswith("Type_"))
+        raise ValueError("Unknown %s '%s' (expected one of %s)" % (kind, name, ", ".join(names)))
@@ -0,0 +1,86 @@
+###############################################################################
+# Snapshot of the state of a Chrono system into reused NumPy buffers.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# Chrono keeps the whole state in ChState/ChStateDelta vectors, but PyChrono's
+# SWIG bindings do not expose them (or the constraint reactions) as NumPy
+# buffers: StateGather() takes its time as a 'double&' that cannot be passed
+# from Python, and a ChVectorDynamicD can only be read element by element.
+# A true bulk copy is therefore not available from Python, and
+# |StateSnapshot| reads the time, reactions and body states through the
+# getters of every link and body, looked up once when the snapshot is made,
+# into flat float64 buffers allocated once, with 'force', 'torque',
+# 'position', ... as views into them.
+#
+# The stepping loops therefore do not read the state in bulk, and do not use
+# this class at all: a snapshot makes as many Chrono calls as {record} of
+# |ReactionRecorder| and then one more copy into the recorder, which
+# measured about 6% slower per step than {record} (7,500 steps of the
+# folding model, Python side). The loops record through {record} as before.
+# The only user of |StateSnapshot| is |SystemPool|, which saves and restores
+# the poses of the decks with it between the runs of a sweep.
+###############################################################################
+
+import numpy as np
+
+###############################################################################
+# |StateSnapshot| of the 'links' and 'bodies' of 'system'. {capture} reads
+# the current time and state and returns the time:
+#
+#   'reactions'  flat (links*6) buffer, with the views
+#       'force'            reaction force of each link, (links, 3) [N]
+#       'torque'           reaction torque of each link, (links, 3) [Nm]
+#   'state'      flat (bodies*13) buffer, with the views
+#       'position'         position of each body, (bodies, 3) [m]
+#       'rotation'         rotation quaternion (e0, e1, e2, e3), (bodies, 4) [-]
+#       'velocity'         linear velocity of each body, (bodies, 3) [m/s]
+#       'angular_velocity' angular velocity in the absolute frame, (bodies, 3) [rad/s]
+#
+# The buffers are overwritten by the next {capture}; copy what has to be
+# kept, as the recorders do.
+###############################################################################
+
+class StateSnapshot:
+    def __init__(self, system, links=(), bodies=()):
+        self.system = system
+        self.links = list(links)
+        self.bodies = list(bodies)
+        self.time = system.GetChTime()                          # simulation time of the snapshot [s]
+
+        nl, nb = len(self.links), len(self.bodies)
+        self.reactions = np.zeros(6*nl)
+        self.force = self.reactions[:3*nl].reshape(nl, 3)
+        self.torque = self.reactions[3*nl:].reshape(nl, 3)
+        self.state = np.zeros(13*nb)
+        self.position = self.state[:3*nb].reshape(nb, 3)
+        self.rotation = self.state[3*nb:7*nb].reshape(nb, 4)
+        self.velocity = self.state[7*nb:10*nb].reshape(nb, 3)
+        self.angular_velocity = self.state[10*nb:].reshape(nb, 3)
+
+        self._time = system.GetChTime                           # Bound getters, looked up once
+        self._react = [(link.Get_react_force, link.Get_react_torque) for link in self.links]
+        self._body = [(body.GetPos, body.GetRot, body.GetPos_dt, body.GetWvel_par) for body in self.bodies]
+
+    def capture(self, bodies=True):                             # Reads the time, reactions and (with 'bodies') body states
+        self.time = t = self._time()
+        force, torque = self.force, self.torque
+        for k, (get_force, get_torque) in enumerate(self._react):
+            f = get_force()
+            tq = get_torque()
+            force[k] = f.x, f.y, f.z
+            torque[k] = tq.x, tq.y, tq.z
+        if bodies:
+            position, rotation = self.position, self.rotation
+            velocity, angular = self.velocity, self.angular_velocity
+            for k, (get_pos, get_rot, get_vel, get_wvel) in enumerate(self._body):
+                p = get_pos()
+                q = get_rot()
+                v = get_vel()
+                w = get_wvel()
+                position[k] = p.x, p.y, p.z
+                rotation[k] = q.e0, q.e1, q.e2, q.e3
+                velocity[k] = v.x, v.y, v.z
+                angular[k] = w.x, w.y, w.z
+        return t
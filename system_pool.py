@@ -0,0 +1,116 @@
+###############################################################################
+# Pool of built bridge models, reused between the runs of a sweep.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+#
+# {build_bridge} creates a new ChSystemNSC, ground, pylons, decks and links
+# for every run, although the points of a sweep over 'omg', 'time_end',
+# 'time_step' or 'rho_c' all have the same bodies in the same places. The
+# pool keeps one built model per topology and only puts it back to its
+# starting state between runs, so the build is paid once per worker process
+# and topology instead of once per sweep point.
+#
+# bridge_sweep.py uses it with --reuse, and only for the points it runs one
+# by one: cached points and batches build models of their own, so --reuse
+# cannot be combined with --cache or --batch.
+###############################################################################
+
+import json
+from collections import OrderedDict
+import pychrono as chrono
+
+import bridge_models
+from bridge_params import DECK_HEIGHT, layout, make_params
+from solver_config import SolverConfig
+from state_snapshot import StateSnapshot
+
+###############################################################################
+# The topology of a model is everything that decides which bodies and links
+# it has and where: the bridge type, the mode, 'l', 'w', 'd', 'leaves', the
+# solver settings and the lean build flag. Runs that only differ in the other
+# parameters can share a model:
+#
+#   'rho_c'                  the deck masses are set again with SetMass()
+#   'omg'                    every motor gets a new ChFunction_Ramp
+#   'time_step', 'time_end'  only used by the stepping loop
+###############################################################################
+
+def topology(bridge, mode, params, solver=None, lean=False):
+    p = make_params(params)
+    solver = json.dumps((solver or SolverConfig()).as_dict(), sort_keys=True)
+    return (bridge, mode, float(p["l"]), float(p["w"]), float(p["d"]), int(p["leaves"]), solver, bool(lean))
+
+class _Entry:                                                   # A pooled model and what it takes to reset it
+    def __init__(self, model):
+        self.model = model
+        snapshot = StateSnapshot(model.system, bodies=model.decks)
+        snapshot.capture()
+        self.position = snapshot.position.copy()                # starting pose of every deck
+        self.rotation = snapshot.rotation.copy()
+        p = model.params
+        decks, joints = layout(model.bridge, p["l"], p["leaves"])
+        self.lengths = [length for length, _ in decks]
+        self.motors = []                                        # (motor, rate, body1, body2, hinge point) of every motor
+        for link, (b1, b2, x, rate) in zip(model.links, joints):
+            if isinstance(link, chrono.ChLinkMotorRotationAngle):
+                self.motors.append((link, rate, model.bodies[b1], model.bodies[b2],
+                                    chrono.ChVectorD(x, DECK_HEIGHT, 5)))
+
+###############################################################################
+# |SystemPool| hands out models with {get}: a model of the same topology
+# built for an earlier run is reset to time 0 with the new parameters,
+# anything else is built with {build_bridge} and kept. Resetting puts every
+# deck back at its starting position and rotation with zero velocity and
+# acceleration, sets the deck masses from 'rho_c', gives each motor a
+# ChFunction_Ramp for the new 'omg' (a constant 0 in "static" mode is kept)
+# and initializes it again, so it measures its angle from the starting pose
+# again. The solver warm-starts from the reactions the last run ended with
+# instead of from zero, which only changes how fast it converges.
+#
+# At most 'max_models' models are kept; the least recently used one is
+# dropped when another is built. 'builds' and 'reuses' count how the models
+# were obtained.
+###############################################################################
+
+class SystemPool:
+    def __init__(self, max_models=8):
+        self.max_models = max_models
+        self.builds = 0
+        self.reuses = 0
+        self._entries = OrderedDict()
+
+    def get(self, bridge, mode, params=None, solver=None, lean=False):
+        key = topology(bridge, mode, params, solver, lean)
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            entry = _Entry(bridge_models.build_bridge(bridge, mode, params, solver, lean))
+            self.builds += 1
+        else:
+            self._reset(entry, make_params(params))
+            self.reuses += 1
+        self._entries[key] = entry
+        while len(self._entries) > self.max_models:
+            self._entries.popitem(last=False)
+        return entry.model
+
+    def _reset(self, entry, p):
+        model = entry.model
+        zero = chrono.ChVectorD(0, 0, 0)
+        for deck, pos, rot, length in zip(model.decks, entry.position, entry.rotation, entry.lengths):
+            deck.SetPos(chrono.ChVectorD(*pos))
+            deck.SetRot(chrono.ChQuaternionD(*rot))
+            deck.SetPos_dt(zero)
+            deck.SetWvel_par(zero)
+            deck.SetPos_dtdt(zero)
+            deck.SetWacc_par(zero)
+            deck.SetMass(length*p["w"]*p["d"]*p["rho_c"])
+        for motor, rate, body1, body2, pos in entry.motors:
+            if model.mode == "kinematic":
+                motor.SetAngleFunction(chrono.ChFunction_Ramp(0, rate*p["omg"]))
+            motor.Initialize(body1, body2, chrono.ChFrameD(pos, chrono.Q_from_AngY(0)))
+        model.system.SetChTime(0)
+        model.params = p
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,53 @@
+###############################################################################
+# Tests of the reaction statistics and of the startup transient detection.
+#
+# Commenting conventions follow the ones described at the top of the model
+# scripts ({} functions, '' variables, <> objects, | | classes, [] units).
+###############################################################################
+
+import numpy as np
+import pytest
+
+from convergence import transient_end
+from reaction_stats import reaction_stats
+
+def _run(n=2000, noisy=(1000, 1050), seed=0):                  # A steady run of two links with a burst of noise at 'noisy'
+    rng = np.random.default_rng(seed)
+    time = np.arange(n)*2e-3
+    force = np.zeros((n, 2, 3))
+    force[..., 1] = 1e6
+    torque = np.zeros((n, 2, 3))
+    torque[..., 2] = 1e5
+    force[noisy[0]:noisy[1], :, 1] += 1e5*rng.standard_normal((noisy[1] - noisy[0], 2))
+    return time, force, torque
+
+def test_transient_at_half_the_run():                           # A transient ending at n/2 leaves the second half to analyze
+    time, force, torque = _run()
+    start = transient_end(time, force, torque, max_fraction=0.5)
+    assert start >= len(time)//2
+    stats = reaction_stats(time, force, torque, start=start)
+    assert np.allclose(stats["reaction"], 1e6, rtol=1e-2)          # The burst is still in the window
+    assert np.allclose(stats["torque"], 1e5)
+
+def test_start_past_half_the_run():
+    time, force, torque = _run()
+    stats = reaction_stats(time, force, torque, start=1500)
+    assert np.allclose(stats["peak_reaction"], 1e6)
+    stacked = reaction_stats(np.stack([time]*2), np.stack([force]*2), np.stack([torque]*2),
+                             start=np.array([1500, 1999]))
+    assert np.allclose(stacked["reaction"], 1e6)
+
+def test_start_at_the_end():
+    time, force, torque = _run()
+    with pytest.raises(ValueError):
+        reaction_stats(time, force, torque, start=len(time))
+
+def test_start_per_run_matches_single_runs():                   # The masked pass of a stack gives the stats of each run on its own
+    runs = [_run(seed=seed) for seed in range(3)]
+    time, force, torque = (np.stack(a) for a in zip(*runs))
+    start = np.array([0, 1020, 1999])
+    stacked = reaction_stats(time, force, torque, start=start)
+    for r, (t, f, tz) in enumerate(runs):
+        single = reaction_stats(t, f, tz, start=start[r])
+        for key, value in single.items():
+            assert np.allclose(stacked[key][r], value), key